@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from 'react';
-import { useStatus } from './controller';
+import { useEvents, useStatus } from './controller';
 import { Scanner } from './Scanner';
 import { isValidPattern, Pattern } from './pattern';
 import { PuzzleSolver, PuzzleState } from './algorithm';
@@ -28,6 +28,7 @@ function App() {
 
 function SolverApp({ pattern, solution }: { pattern: string, solution: string | null }) {
     const { status, sendCommand, currentCommand } = useStatus();
+    const events = useEvents();
     function startGame() {
         if (solution) {
             sendCommand({
@@ -67,8 +68,9 @@ function SolverApp({ pattern, solution }: { pattern: string, solution: string |
             </h2>}
             {status.status === "aborted" && <h2 className="info">Game was aborted</h2>}
             {status.status === "finish" && <h2 className="success">Game was solved in {(status.duration ?? 0)} seconds</h2>}
-            {status.status === "solve-failed" && <h2 className="error">Unsolvable Game!</h2>}
-            {status.status === "solve" && <h2 className="info">Searching solution (depth: {status.search_depth}, duration: {status.duration ?? 0}ms)</h2>}
+            {status.status === "solve-failed" && <h2 className="error">Unsolvable Game!{status.problem && <> ({status.problem.message})</>}</h2>}
+            {status.status === "solve-succeeded" && <h2 className="info">Found solution with {status.solution_length} steps, about {Math.round((status.predicted_duration ?? 0) / 1000)}s to move</h2>}
+            {status.status === "solve" && <h2 className="info">Searching solution (depth: {status.search_depth}, duration: {status.duration ?? 0}ms{status.stats && <>, {status.stats.nodes} states at {status.stats.nodes_per_second}/s</>})</h2>}
             {status.status === "move" && <>
                 <h2 className="info">Applying solution</h2>
                 <p>
@@ -84,6 +86,11 @@ function SolverApp({ pattern, solution }: { pattern: string, solution: string |
                 <button onClick={startGame}>Start Game!</button>
             </>}
             {(status.status === "solve-failed" || status.status === "waiting" || status.status === "aborted" || status.status === "finish") && <button onClick={newGame}>{status.status === "finish" ? "New Game" : "Scan again"}</button>}
+            {events.length > 0 && <ul className="events">
+                {events.map(event => <li key={event.id}>
+                    {new Date(event.time).toLocaleTimeString()} {event.status.status}{event.status.step && <> {event.status.step}</>}
+                </li>)}
+            </ul>}
         </div>)
     ;
 }
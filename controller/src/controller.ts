@@ -1,11 +1,39 @@
 import { useEffect, useState } from "react";
 import { Pattern } from "./pattern";
 
+// The milliseconds the robot spent in the phases of a move
+export interface MoveTelemetry {
+    step: string;
+    level: number; // waiting for the previous axis to be level
+    lock: number;
+    tilt: number; // tilting the axis
+    slide: number; // waiting for the tiles
+    duration: number;
+}
+
 export interface Status {
+    // increases with every change of the status
+    version?: number;
     status: "no connection" | "not running" | "waiting" | "solve" | "solve-failed" | "solve-succeeded" | "move" | "aborted" | "finish";
     duration?: number;
     search_depth?: number;
+    // the SolverStats of the search, and the statistics of the TranspositionTable
+    stats?: {
+        bound: number, nodes: number, nodes_per_depth: number[], nodes_per_second: number, branching_factor: number,
+        solutions_found: number, solutions_improved: number, rounds: { bound: number, duration: number, nodes: number }[],
+        hits: number, pruned: number, entries: number, evictions: number
+    };
     text?: string;
+    // while moving, the index of the move in the solution and its step
+    move?: number;
+    step?: string;
+    solution_length?: number;
+    // the milliseconds the robot is predicted to need for the solution
+    predicted_duration?: number;
+    // why a scanned pattern cannot be solved
+    problem?: { reason: "size" | "free-field" | "tiles" | "parity", message: string };
+    // of the previous move while moving, of all moves once finished
+    telemetry?: MoveTelemetry | MoveTelemetry[];
 }
 
 export interface Command {
@@ -18,8 +46,60 @@ export interface Command {
 }
 
 
-export async function getStatus(): Promise<Status> {
-    return await (await fetch(`/status`, { signal: AbortSignal.timeout(20000) })).json();
+export async function getStatus(since?: number): Promise<Status> {
+    // with since, the robot answers once there is a newer status than that version (or after 20s)
+    const query = since !== undefined ? `?since=${since}` : "";
+    return await (await fetch(`/status${query}`, { signal: AbortSignal.timeout(30000) })).json();
+}
+
+// A status as recorded by the robot, time in milliseconds since the epoch
+export interface StatusEvent {
+    id: number;
+    time: number;
+    status: Status;
+}
+
+export interface StatusEvents {
+    events: StatusEvent[];
+    // the cursor for the next request
+    cursor: number;
+    // whether events after the requested cursor were already dropped from the log
+    missed: boolean;
+}
+
+export async function getEvents(after: number = 0): Promise<StatusEvents> {
+    // all events after the cursor in one response, or the next one within 20s
+    return await (await fetch(`/events?after=${after}`, { signal: AbortSignal.timeout(30000) })).json();
+}
+
+// The latest status events of the robot, which catches up with the events missed while disconnected
+export function useEvents(limit: number = 20) {
+    const [events, setEvents] = useState<StatusEvent[]>([]);
+
+    useEffect(() => {
+        let cancel = false;
+
+        (async function() {
+            let cursor = 0;
+            while (true) {
+                if (cancel) return;
+
+                try {
+                    const result = await getEvents(cursor);
+                    if (cancel) return;
+                    cursor = result.cursor;
+                    if (result.events.length > 0) {
+                        setEvents(it => it.concat(result.events).slice(-limit));
+                    }
+                } catch (error) {
+                    await new Promise(res => setTimeout(res, 1000));
+                }
+            }
+        })();
+        return () => { cancel = true; };
+    }, [limit]);
+
+    return events;
 }
 
 export function useStatus() {
@@ -36,25 +116,41 @@ export function useStatus() {
         });
     }
 
+    function updateStatus(newStatus: Status) {
+        // Reset current command if the bot reacted
+        const change = newStatus.status !== status.status;
+        if (currentCommand && change) setCurrentCommand(null);
+
+        setStatus(newStatus);
+    }
+
     useEffect(() => {
         let cancel = false;
 
+        // The robot pushes each new status as Server-Sent Events
+        if (typeof EventSource !== "undefined") {
+            const events = new EventSource(`/status/stream`);
+            events.onmessage = event => updateStatus(JSON.parse(event.data));
+            // the EventSource reconnects by itself
+            events.onerror = () => setStatus({ "status": "no connection" });
+            return () => events.close();
+        }
+
+        // Otherwise long-poll for the next version
         (async function() {
+            let version: number | undefined = undefined;
             while (true) {
                 if (cancel) return;
 
                 try {
-                    const newStatus = await getStatus();
-                    // Reset current command if the bot reacted
-                    const change = newStatus.status !== status.status;
-                    if (currentCommand && change) setCurrentCommand(null);
-
-                    setStatus(newStatus);
+                    const newStatus = await getStatus(version);
+                    version = newStatus.version;
+                    updateStatus(newStatus);
                 } catch (error) {
+                    version = undefined;
                     setStatus({ "status": "no connection" });
+                    await new Promise(res => setTimeout(res, 1000));
                 }
-
-                await new Promise(res => setTimeout(res, 1000));
             }
         })();
         return () => { cancel = true; };
@@ -62,4 +158,3 @@ export function useStatus() {
 
     return { status, sendCommand, currentCommand } ;
 }
-
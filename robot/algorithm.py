@@ -1,5 +1,18 @@
 import random
 
+try:
+    import heapq
+except ImportError:
+    import uheapq as heapq # MicroPython
+
+try:
+    from time import ticks_ms as time_ms # MicroPython
+except ImportError:
+    from time import perf_counter
+
+    def time_ms():
+        return int(perf_counter() * 1000)
+
 # ------- Step --------
 # The direction into which tiles move by lifting the field on one side
 class StepDirection:
@@ -11,6 +24,10 @@ class StepDirection:
 
     def inverse(self):
         return StepDirection(((self.value + 2) %4))
+
+    # The direction on the board mirrored at its diagonal, which swaps the axes
+    def transpose(self):
+        return StepDirection(self.value ^ 1)
     
     def is_x(self):
         return (self.value % 2) == 1 # left, right
@@ -22,13 +39,17 @@ class StepDirection:
     def is_opposite(self):
         return self.value >= 2 # down, right
     
-    # The number of fields in the direction
-    def size(self):
-        return SIZE_X if self.is_x() else SIZE_Y
+    # The number of fields in the direction, on the board (by default the 3x3 BOARD)
+    def size(self, board = None):
+        if board == None:
+            board = BOARD
+        return board.size_x if self.is_x() else board.size_y
 
     # position + stride returns the next position on the field in the direction
-    def stride(self):
-        return (1 if self.is_x() else SIZE_X) * (1 if self.is_opposite() else -1)
+    def stride(self, board = None):
+        if board == None:
+            board = BOARD
+        return board.strides[self.value]
     
     def char(self):
         if self == StepDirection.DOWN:
@@ -54,15 +75,21 @@ class StepDirection:
         raise Exception("Unknown direction")
         
     # ---- Position Utilities -----
-    def offset_in_dir(self, pos: int):
-        pos_in_axis = int(pos / SIZE_X) if self.is_y() else (pos % SIZE_X)
-        return (self.size() - 1) - pos_in_axis if self.is_opposite() else pos_in_axis
+    # These look up the tables of the Board
+    def offset_in_dir(self, pos: int, board = None):
+        if board == None:
+            board = BOARD
+        return (self.size(board) - 1) - board.max_moves(pos, self)
 
-    def max_moves(self, pos: int):
-        return (self.size() - 1) - self.offset_in_dir(pos)
+    def max_moves(self, pos: int, board = None):
+        if board == None:
+            board = BOARD
+        return board.max_moves(pos, self)
 
-    def is_at_border(self, pos: int):
-        return self.offset_in_dir(pos) == self.size() - 1
+    def is_at_border(self, pos: int, board = None):
+        if board == None:
+            board = BOARD
+        return board.max_moves(pos, self) == 0
     
     @staticmethod
     def random():
@@ -88,6 +115,10 @@ class Step:
     # e.g. the opposite of moving two to the left is moving two to the right
     def inverse(self):
         return Step(self.direction.inverse(), self.move_count)
+
+    # returns the Step on the puzzle mirrored at its diagonal
+    def transpose(self):
+        return Step(self.direction.transpose(), self.move_count)
     
     def to_str(self):
         return self.direction.char() + str(self.move_count)
@@ -104,7 +135,7 @@ class Step:
 # ----- PuzzleState -----
 # The state of the puzzle at a certain point in time
 
-# The dimensions of the puzzle
+# The dimensions of the puzzle of the robot
 SIZE_X = 3
 SIZE_Y = 3
 
@@ -121,15 +152,238 @@ def to_pos(x: int, y: int):
     return y * SIZE_X + x
 
 FREE_FIELD = 0
-TARGET_FIELDS = (1, 2, 3, 4, 5, 6, 7, 8, 0)
+# The characters of the fields in PuzzleState.to_str
+FIELD_CHARS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+# The bits per field of a PackedPuzzleState on the 3x3 board, where tile 8 is packed as 0 like the free field
+# so that the packed value has 27 bits and stays a small int on MicroPython
+FIELD_BITS = 3
+FIELD_MASK = (1 << FIELD_BITS) - 1
+
+# The most steps an optimal solution needs, per (size_x, size_y): on the 3x3 board 24 (see SolutionTable),
+# on the 4x4 board the 80 single tile moves of the 15 puzzle, as a step moves at least one tile
+MAX_DEPTHS = { (3, 3): 24, (4, 4): 80 }
+
+# ----- Board -----
+# The dimensions of a puzzle with size_x x size_y fields, and the lookups to move on it,
+# which are computed once per size (see Board.get). Each PuzzleState refers to its board,
+# the puzzle of the robot is on BOARD
+class Board:
+    boards = dict()
+
+    def __init__(self, size_x: int, size_y: int):
+        assert(size_x > 1 and size_y > 1)
+        self.size_x = size_x
+        self.size_y = size_y
+        self.size = size_x * size_y
+        # the tiles in order, with the free field last
+        self.target = tuple(range(1, self.size)) + (FREE_FIELD,)
+        # the maximum number of tiles moved by one step
+        self.max_step = max(size_x, size_y) - 1
+        # the depth the solvers search to by default, on other boards generously above the single tile moves
+        # known to solve them
+        self.max_depth = MAX_DEPTHS.get((size_x, size_y), self.size * (size_x + size_y))
+        self.xs = [pos % size_x for pos in range(0, self.size)]
+        self.ys = [pos // size_x for pos in range(0, self.size)]
+        # per direction value (up, left, down, right)
+        self.strides = [-size_x, -1, size_x, 1]
+        # per (pos * 4 + direction value) the number of tiles a step can move, i.e. the fields
+        # behind the free field against the direction
+        self.moves = list()
+        for pos in range(0, self.size):
+            self.moves += [size_y - 1 - self.ys[pos], size_x - 1 - self.xs[pos], self.ys[pos], self.xs[pos]]
+        # enough bits per field for the tiles, if the last tile does not fit it is packed as 0 like the free field,
+        # which is told apart by the position of the free field (see PackedPuzzleState)
+        self.field_bits = 1
+        while (1 << self.field_bits) < self.size - 1:
+            self.field_bits += 1
+        self.field_mask = (1 << self.field_bits) - 1
+        self.zero_tile = self.size - 1 if (1 << self.field_bits) == self.size - 1 else FREE_FIELD
+        # the bits of a position, and the bits of all fields but the last one, which key a state (see key)
+        self.pos_bits = 1
+        while (1 << self.pos_bits) < self.size:
+            self.pos_bits += 1
+        self.key_mask = (1 << (self.field_bits * (self.size - 1))) - 1
+        self.move_table = self.build_move_table()
+        # The moves of the SearchCore, numbered like the move_table: per move the bits to keep and to move,
+        # the shifts that move them (one of both is 0), the position of the free field afterwards, 1 for moves on the x axis
+        # and the Step. These are allocated once, so that the search only computes ints
+        self.move_keep = [entry[0] for entry in self.move_table]
+        self.move_mask = [entry[1] for entry in self.move_table]
+        self.move_left = [max(entry[2], 0) for entry in self.move_table]
+        self.move_right = [max(-entry[2], 0) for entry in self.move_table]
+        self.move_free = [entry[3] for entry in self.move_table]
+        self.move_x = [(move // self.max_step) % 2 for move in range(0, len(self.move_table))]
+        self.move_steps = [Step(StepDirection((move // self.max_step) % 4), move % self.max_step + 1)
+            for move in range(0, len(self.move_table))]
+        # per (pos * 3 + axis of the previous step) the possible moves,
+        # with the axis 0 for no previous step, 1 after a step on the x axis and 2 after one on the y axis
+        self.child_moves = list()
+        for pos in range(0, self.size):
+            for directions in ((0, 2, 1, 3), (2, 0), (3, 1)):
+                self.child_moves.append(tuple((pos * 4 + direction) * self.max_step + move_count - 1
+                    for direction in directions for move_count in range(1, self.moves[pos * 4 + direction] + 1)))
+        # per move the possible moves after it
+        self.move_children = [self.child_moves[self.move_free[move] * 3 + (1 if self.move_x[move] == 1 else 2)]
+            for move in range(0, len(self.move_table))]
+        # the Step of each possible move, see possible_steps
+        self.steps = [[self.move_steps[move] for move in moves] for moves in self.child_moves]
+
+    # Returns the shared board with the dimensions
+    @staticmethod
+    def get(size_x: int, size_y: int):
+        key = (size_x, size_y)
+        if key not in Board.boards:
+            Board.boards[key] = Board(size_x, size_y)
+        return Board.boards[key]
+
+    # Returns the square board for the number of fields (BOARD for 9), boards with other dimensions
+    # need to be passed explicitly
+    @staticmethod
+    def for_fields(fields):
+        count = len(fields)
+        if count == BOARD.size:
+            return BOARD
+        size = int(round(count ** 0.5))
+        if size * size != count:
+            raise Exception("No square board with " + str(count) + " fields, pass the Board")
+        return Board.get(size, size)
+
+    def to_x(self, pos: int):
+        return self.xs[pos]
+
+    def to_y(self, pos: int):
+        return self.ys[pos]
+
+    def to_pos(self, x: int, y: int):
+        return y * self.size_x + x
+
+    def max_moves(self, pos: int, direction: StepDirection):
+        return self.moves[pos * 4 + direction.value]
+
+    # The possible steps from pos, which alternate the axis after prev_step. The list is shared, do not modify it
+    def possible_steps(self, pos: int, prev_step: Step = None):
+        if prev_step == None:
+            return self.steps[pos * 3]
+        return self.steps[pos * 3 + (1 if prev_step.direction.is_x() else 2)]
+
+    # For each (free_pos, direction, move_count) the bits to keep, the bits of the moving fields,
+    # the shift that moves them by one position and the position of the free field afterwards (see PackedPuzzleState)
+    def build_move_table(self):
+        all_bits = (1 << (self.field_bits * self.size)) - 1
+        table = list()
+        for free_pos in range(0, self.size):
+            for direction_value in range(0, 4):
+                stride = self.strides[direction_value]
+                for move_count in range(1, self.max_step + 1):
+                    # moves beyond the border are clamped, just like PuzzleState.apply does
+                    count = min(move_count, self.moves[free_pos * 4 + direction_value])
+                    mask = 0
+                    for i in range(1, count + 1):
+                        mask |= self.field_mask << (self.field_bits * (free_pos - i * stride))
+                    table.append((all_bits ^ mask, mask, stride * self.field_bits, free_pos - count * stride))
+        return table
+
+    def move_index(self, free_pos: int, step: Step) -> int:
+        return (free_pos * 4 + step.direction.value) * self.max_step + min(step.move_count, self.max_step) - 1
+
+    # Returns the packed value (see PackedPuzzleState) after the move
+    def apply_move(self, value: int, move: int) -> int:
+        return (value & self.move_keep[move]) | (((value & self.move_mask[move]) << self.move_left[move]) >> self.move_right[move])
+
+    # A distinct int for each state, from the packed value and the position of the free field. The last field
+    # is left out, as it holds the one tile (or the free field) missing in the other fields. On the 3x3 board
+    # the key has 28 bits, so it stays a small int on MicroPython
+    def key(self, value: int, free_pos: int) -> int:
+        return ((value & self.key_mask) << self.pos_bits) | free_pos
+
+    # The fields of the packed value, as a (new) list
+    def unpack(self, value: int, free_pos: int):
+        fields = list()
+        for pos in range(0, self.size):
+            field = value & self.field_mask
+            value >>= self.field_bits
+            fields.append(self.zero_tile if field == FREE_FIELD and pos != free_pos else field)
+        return fields
+
+BOARD = Board.get(SIZE_X, SIZE_Y)
+TARGET_FIELDS = BOARD.target
+
+# The index of the fields in the lexicographic order of all permutations (Lehmer code)
+# e.g. (0, 1, 2, ..., 8) has rank 0 and (8, 7, 6, ..., 0) has rank 9! - 1
+def permutation_rank(fields) -> int:
+    rank = 0
+    count = len(fields)
+    for i in range(0, count):
+        smaller = 0
+        for j in range(i + 1, count):
+            if fields[j] < fields[i]:
+                smaller += 1
+        rank = rank * (count - i) + smaller
+    return rank
+
+# The number of pairs of tiles in the wrong order, ignoring the free field
+def inversion_count(fields) -> int:
+    tiles = [field for field in fields if field != FREE_FIELD]
+    count = 0
+    for i in range(0, len(tiles)):
+        for j in range(i + 1, len(tiles)):
+            if tiles[j] < tiles[i]:
+                count += 1
+    return count
+
+# Checks the fields before any search starts - e.g. a failed scan can produce duplicate tiles or
+# a board that cannot be solved. Returns None if the puzzle can be solved, otherwise
+# a dict with the "reason" ("size", "free-field", "tiles" or "parity") and a "message"
+# board - the Board of the target, by default the square board with as many fields
+def validate_puzzle(fields, target_fields = TARGET_FIELDS, board = None):
+    def invalid(reason: str, message: str):
+        return { "reason": reason, "message": message }
+
+    if len(fields) != len(target_fields):
+        return invalid("size", "expected " + str(len(target_fields)) + " fields, got " + str(len(fields)))
+
+    free_count = 0
+    for field in fields:
+        if field == FREE_FIELD:
+            free_count += 1
+    if free_count != 1:
+        return invalid("free-field", "expected one free field, got " + str(free_count))
+
+    counts = dict()
+    for field in fields:
+        counts[field] = counts.get(field, 0) + 1
+    for field in target_fields:
+        if counts.get(field, 0) != 1:
+            duplicates = [str(tile) for tile in sorted(counts.keys()) if counts[tile] > 1]
+            missing = [str(tile) for tile in target_fields if tile not in counts]
+            return invalid("tiles", "duplicate tiles " + ",".join(duplicates) + ", missing tiles " + ",".join(missing))
+
+    # Every step moves tiles across the free field. Along a row this keeps the order of the tiles,
+    # along a column each tile passes size_x - 1 others, which keeps the parity for an odd size_x.
+    # Otherwise each row of the free field flips the parity
+    if board == None:
+        board = Board.for_fields(target_fields)
+    parity = inversion_count(fields) - inversion_count(target_fields)
+    if board.size_x % 2 == 0:
+        parity += board.to_y(list(fields).index(FREE_FIELD)) - board.to_y(list(target_fields).index(FREE_FIELD))
+    if parity % 2 != 0:
+        return invalid("parity", "the tiles cannot be brought into the target order")
+
+    return None
 
 class PuzzleState:
-    # fields - The fields as a SIZE_Y x SIZE_X array
-    def __init__(self, fields = TARGET_FIELDS):
+    # fields - The fields as a size_y x size_x array
+    # board - the Board of the fields, by default the square board with as many fields
+    def __init__(self, fields = TARGET_FIELDS, board: Board = None):
+        self.board = board if board != None else Board.for_fields(fields)
         self.fields = list(fields)
         # the position of the free field
         self.free_pos = fields.index(FREE_FIELD)
 
+    def copy(self):
+        return PuzzleState(self.fields, self.board)
+
     # Applies a Step to the Puzzle State
     def apply(self, step: Step):
         start_free_pos = self.free_pos
@@ -138,14 +392,12 @@ class PuzzleState:
             assert(self.fields[self.free_pos] == FREE_FIELD)
             assert(step.move_count > 0)
 
-            stride = step.direction.stride()
+            stride = self.board.strides[step.direction.value]
 
-            count = 0
-            while not step.direction.is_at_border(self.free_pos) and count < step.move_count:
+            for i in range(0, min(step.move_count, self.board.max_moves(self.free_pos, step.direction))):
                 prev_pos = self.free_pos - stride
                 self.fields[self.free_pos] = self.fields[prev_pos]
                 self.free_pos = prev_pos
-                count += 1
             
             self.fields[self.free_pos] = FREE_FIELD
         except Exception:
@@ -159,21 +411,21 @@ class PuzzleState:
             raise
 
     def to_str(self, step: Step = None) -> str:
-        line_length = SIZE_X * 4
-        result = bytearray(((" " * (line_length - 1)) + "\n") * (SIZE_Y * 2 + 1), "utf-8")
+        board = self.board
+        line_length = board.size_x * 4
+        result = bytearray(((" " * (line_length - 1)) + "\n") * (board.size_y * 2 + 1), "utf-8")
         
         # turns coordinates into fields into string positions
         def to_str(pos: int):
-            x = to_x(pos)
-            y = to_y(pos)
+            x = board.to_x(pos)
+            y = board.to_y(pos)
             return x * 4 + 1 + (y * 2 + 1) * line_length
 
         # Fill with fields
-        for y in range(0, SIZE_Y):
-            for x in range(0, SIZE_X):
-                field = self.fields[x + SIZE_X * y]
-                if field != FREE_FIELD:
-                    result[to_str(to_pos(x, y))] = field + 48 # "0" at 48 in ASCII
+        for pos in range(0, board.size):
+            field = self.fields[pos]
+            if field != FREE_FIELD:
+                result[to_str(pos)] = ord(FIELD_CHARS[field])
         
         # Add movement
         if step != None:
@@ -181,11 +433,9 @@ class PuzzleState:
             pos = self.free_pos
             result[to_str(pos) + marker_offset] = ord('x')
         
-            count = 0
-            while not step.direction.is_at_border(pos) and count < step.move_count:
-                pos -= step.direction.stride()
+            for i in range(0, min(step.move_count, board.max_moves(pos, step.direction))):
+                pos -= board.strides[step.direction.value]
                 result[to_str(pos) + marker_offset] = ord(step.direction.char())
-                count += 1
 
         return result.decode("utf-8")
 
@@ -200,26 +450,72 @@ class PuzzleState:
             else:
                 direction = StepDirection.RIGHT if opposite else StepDirection.LEFT
 
-        max_moves = direction.max_moves(self.free_pos)
+        max_moves = self.board.max_moves(self.free_pos, direction)
         if max_moves == 0: # useless Step that does nothing
             return self.randomStep(prevStep)
         moves = 1 if max_moves == 1 else random.randint(1, max_moves)
         return Step(direction, moves)
     
+    # The steps that move tiles, alternating the axis after prevStep (a shared list, see Board.possible_steps)
     def possibleSteps(self, prevStep: Step = None):
-        if prevStep == None:
-            possibleDirections = [StepDirection.UP, StepDirection.DOWN, StepDirection.LEFT, StepDirection.RIGHT]
+        return self.board.possible_steps(self.free_pos, prevStep)
+
+# ----- PackedPuzzleState -----
+# A PuzzleState that packs the fields into a single int, with the field_bits of the board per field
+# (the field at pos is stored at bit pos * field_bits), and keeps the position of the free field next to it.
+# As the free field is 0, a step is applied by shifting all moving fields at once by the stride.
+# Where the last tile does not fit into the bits (tile 8 on the 3x3 board), it is packed as 0 as well -
+# then the value and the position of the free field together tell the state (see Board.key)
+
+def pack_fields(fields, field_bits: int = FIELD_BITS) -> int:
+    field_mask = (1 << field_bits) - 1
+    value = 0
+    for pos in range(len(fields) - 1, -1, -1):
+        value = (value << field_bits) | (fields[pos] & field_mask)
+    return value
+
+class PackedPuzzleState(PuzzleState):
+    # fields - The fields as a size_y x size_x array, or None if value and free_pos are given
+    # board - the Board of the fields, by default the square board with as many fields (or BOARD without fields)
+    def __init__(self, fields = TARGET_FIELDS, value: int = 0, free_pos: int = 0, board: Board = None):
+        if fields == None:
+            self.board = board if board != None else BOARD
+            self.value = value
+            self.free_pos = free_pos
         else:
-            if prevStep.direction.is_x():
-                possibleDirections = [StepDirection.DOWN, StepDirection.UP]
-            else:
-                possibleDirections = [StepDirection.RIGHT, StepDirection.LEFT]
-        possibleSteps = []
-        for direction in possibleDirections:
-            max_moves = direction.max_moves(self.free_pos)
-            for move_count in range(1, max_moves + 1):
-                possibleSteps.append(Step(direction, move_count))
-        return possibleSteps
+            self.board = board if board != None else Board.for_fields(fields)
+            self.value = pack_fields(fields, self.board.field_bits)
+            self.free_pos = list(fields).index(FREE_FIELD)
+
+    @staticmethod
+    def from_value(value: int, free_pos: int, board: Board = None):
+        return PackedPuzzleState(None, value, free_pos, board)
+
+    # The unpacked fields, as a (new) list
+    @property
+    def fields(self):
+        return self.board.unpack(self.value, self.free_pos)
+
+    def copy(self):
+        return PackedPuzzleState.from_value(self.value, self.free_pos, self.board)
+
+    def apply(self, step: Step):
+        board = self.board
+        keep, mask, shift, free_pos = board.move_table[(self.free_pos * 4 + step.direction.value) * board.max_step
+            + min(step.move_count, board.max_step) - 1]
+        if shift > 0:
+            self.value = (self.value & keep) | ((self.value & mask) << shift)
+        else:
+            self.value = (self.value & keep) | ((self.value & mask) >> -shift)
+        self.free_pos = free_pos
+
+    def __eq__(self, other):
+        if isinstance(other, PackedPuzzleState):
+            return self.value == other.value and self.free_pos == other.free_pos
+        return self.fields == list(other.fields)
+
+    def __hash__(self):
+        return self.board.key(self.value, self.free_pos)
 
     
 class StepSequence:
@@ -227,7 +523,7 @@ class StepSequence:
         self.steps = steps if steps != None else list()
 
     def fillRandom(self, length: int, puzzle: PuzzleState = PuzzleState()):
-        current_state = PuzzleState(puzzle.fields)
+        current_state = puzzle.copy()
         current_step = None
         for i in range(0, length):
             current_step = current_state.randomStep(current_step)
@@ -249,7 +545,74 @@ class StepSequence:
         for step in self.steps:
             result += " " + step.to_str()
         return result
-    
+
+    # Returns the step that moves the free field from start_pos to end_pos in the same row or column,
+    # or None if both are the same
+    @staticmethod
+    def step_between(start_pos: int, end_pos: int, board: Board = None):
+        if board == None:
+            board = BOARD
+        if start_pos == end_pos:
+            return None
+        if board.to_y(start_pos) == board.to_y(end_pos):
+            if end_pos < start_pos:
+                return Step(StepDirection.RIGHT, start_pos - end_pos)
+            return Step(StepDirection.LEFT, end_pos - start_pos)
+        if end_pos < start_pos:
+            return Step(StepDirection.DOWN, (start_pos - end_pos) // board.size_x)
+        return Step(StepDirection.UP, (end_pos - start_pos) // board.size_x)
+
+    # Returns an equivalent StepSequence without steps that move no tiles (at the border),
+    # and with consecutive steps on the same axis merged into one or cancelled.
+    # Steps on one axis only move the free field along its row or column, so a run of them
+    # is equivalent to the single step between the free field before and after it
+    def merged(self, puzzle: PuzzleState = PuzzleState()):
+        state = puzzle.copy()
+        steps = list()
+        # the position of the free field before each of the steps
+        starts = list()
+        for step in self.steps:
+            start_pos = state.free_pos
+            state.apply(step)
+            if state.free_pos == start_pos:
+                continue
+            if len(steps) > 0 and steps[-1].direction.is_x() == step.direction.is_x():
+                steps.pop()
+                start_pos = starts.pop()
+            merged_step = StepSequence.step_between(start_pos, state.free_pos, state.board)
+            if merged_step != None:
+                steps.append(merged_step)
+                starts.append(start_pos)
+        return StepSequence(steps)
+
+    # Returns an equivalent StepSequence that is merged and where each segment of up to window steps
+    # is replaced by a shorter one, if a local search finds one - e.g. for solutions from outside
+    # or shuffles, before the robot spends seconds on each step
+    def optimize(self, puzzle: PuzzleState = PuzzleState(), window: int = 8):
+        sequence = self.merged(puzzle)
+        improved = True
+        while improved:
+            improved = False
+            states = [puzzle.copy()]
+            for step in sequence.steps:
+                state = states[-1].copy()
+                state.apply(step)
+                states.append(state)
+
+            # two steps on different axes are never equivalent to a shorter sequence
+            for start in range(0, len(sequence.steps) - 2):
+                for length in range(min(window, len(sequence.steps) - start), 2, -1):
+                    solver = PuzzleSolver(states[start], states[start + length])
+                    solver.solve_ida(length - 1)
+                    if solver.solution != None:
+                        steps = sequence.steps[:start] + solver.solution.steps + sequence.steps[start + length:]
+                        sequence = StepSequence(steps).merged(puzzle)
+                        improved = True
+                        break
+                if improved:
+                    break
+        return sequence
+
     @staticmethod
     def from_str(str):
         print("StepSequence::from_str" + str)
@@ -260,7 +623,7 @@ class StepSequenceCursor:
     index = 0
     def __init__(self, sequence: StepSequence, puzzle: PuzzleState = PuzzleState()):
         self.sequence = sequence
-        self.puzzle = PuzzleState(puzzle.fields)
+        self.puzzle = puzzle.copy()
 
     def has_next(self):
         return self.index < len(self.sequence.steps)
@@ -286,76 +649,850 @@ class StepSequenceCursor:
         result += self.puzzle.to_str(self.currentStep() if self.has_next() else None)
         return result
 
+# ----- SolutionTable -----
+# A precomputed table (see build_table.py) that contains the optimal next step and
+# the distance to TARGET_FIELDS for every state of the puzzle, indexed by permutation_rank.
+# Each entry is one byte - the upper 3 bits encode the step (direction * 2 + move_count - 1),
+# the lower 5 bits the distance. States that cannot reach the target are TABLE_UNSOLVABLE
+
+TABLE_PATH = "./solution_table.bin"
+TABLE_UNSOLVABLE = 0xFF
+TABLE_SIZE = 362880 # 9!
+
+class SolutionTable:
+    loaded = None
+
+    def __init__(self, path: str = TABLE_PATH):
+        self.file = open(path, "rb")
+        try:
+            import mmap
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ImportError:
+            # MicroPython has no mmap, read single entries from the file instead
+            self.data = None
+
+    # Returns the shared table, or None if the table was not built
+    @staticmethod
+    def load(path: str = TABLE_PATH):
+        if SolutionTable.loaded == None:
+            try:
+                SolutionTable.loaded = SolutionTable(path)
+            except OSError:
+                return None
+        return SolutionTable.loaded
+
+    @staticmethod
+    def encode(step: Step, distance: int) -> int:
+        if step == None:
+            return distance
+        return ((step.direction.value * 2 + step.move_count - 1) << 5) | distance
+
+    @staticmethod
+    def decode_step(entry: int) -> Step:
+        move = entry >> 5
+        return Step(StepDirection(move // 2), move % 2 + 1)
+
+    def entry(self, fields) -> int:
+        rank = permutation_rank(fields)
+        if self.data != None:
+            return self.data[rank]
+        self.file.seek(rank)
+        return self.file.read(1)[0]
+
+    def close(self):
+        if self.data != None:
+            self.data.close()
+        self.file.close()
+        if SolutionTable.loaded == self:
+            SolutionTable.loaded = None
+
+# ----- PuzzleHeuristic -----
+# A lower bound of the steps needed to reach the target, for the IDA* search.
+# A step moves at most SIZE - 1 tiles by one field along its axis, so the sum of all horizontal
+# (vertical) tile distances divided by size_x - 1 (size_y - 1) bounds the number of steps along that axis.
+# Two tiles in their target row (column) but in the wrong order additionally need one of them
+# to leave and reenter the row, which adds two vertical (horizontal) tile moves (linear conflict).
+# As the axis of the steps alternates in optimal solutions, also at most half of the steps are on one axis
+
+# The number of tiles to remove from a line to resolve all linear conflicts,
+# targets - the target positions of the tiles in the line that belong to the line, the count ones from start on
+# longest - a list of at least count ints to work in, so that nothing is allocated
+def line_conflicts(targets, start: int = 0, count: int = None, longest = None) -> int:
+    if count == None:
+        count = len(targets)
+    if count < 2:
+        return 0
+    if longest == None:
+        longest = [0] * count
+    # length of the longest increasing subsequence - these tiles can stay in the line
+    most = 1
+    for i in range(0, count):
+        target = targets[start + i]
+        length = 1
+        for j in range(0, i):
+            if targets[start + j] < target and longest[j] + 1 > length:
+                length = longest[j] + 1
+        longest[i] = length
+        if length > most:
+            most = length
+    return count - most
+
+class PuzzleHeuristic:
+    def __init__(self, target: PuzzleState = PuzzleState(), linear_conflict: bool = True):
+        self.linear_conflict = linear_conflict
+        self.board = target.board
+        # the target x and y of each tile
+        self.target_x = [0] * self.board.size
+        self.target_y = [0] * self.board.size
+        for pos, field in enumerate(target.fields):
+            self.target_x[field] = self.board.to_x(pos)
+            self.target_y[field] = self.board.to_y(pos)
+        # The lists estimate works in, allocated once: the target x of the tiles in their target row (per row
+        # size_x from y * size_x on), then the target y of the tiles in their target column (per column size_y
+        # from rows_size + x * size_y on), the number of tiles in each row and column, and for line_conflicts
+        self.rows_size = self.board.size_y * self.board.size_x
+        self.lines = [0] * (2 * self.board.size)
+        self.line_counts = [0] * (self.board.size_y + self.board.size_x)
+        self.longest = [0] * max(self.board.size_x, self.board.size_y)
+
+    # Estimates the steps to reach the target from the packed state value with the free field at free_pos
+    def estimate(self, value: int, free_pos: int) -> int:
+        board = self.board
+        field_bits = board.field_bits
+        field_mask = board.field_mask
+        zero_tile = board.zero_tile
+        size_x = board.size_x
+        size_y = board.size_y
+        rows_size = self.rows_size
+        lines = self.lines
+        line_counts = self.line_counts
+        for i in range(0, size_y + size_x):
+            line_counts[i] = 0
+        distance_x = 0
+        distance_y = 0
+
+        for pos in range(0, board.size):
+            field = value & field_mask
+            value >>= field_bits
+            if field == FREE_FIELD:
+                if pos == free_pos:
+                    continue
+                field = zero_tile
+
+            x = board.xs[pos]
+            y = board.ys[pos]
+            target_x = self.target_x[field]
+            target_y = self.target_y[field]
+            distance_x += abs(x - target_x)
+            distance_y += abs(y - target_y)
+            if target_y == y:
+                lines[y * size_x + line_counts[y]] = target_x
+                line_counts[y] += 1
+            if target_x == x:
+                lines[rows_size + x * size_y + line_counts[size_y + x]] = target_y
+                line_counts[size_y + x] += 1
+
+        if self.linear_conflict:
+            longest = self.longest
+            for y in range(0, size_y):
+                distance_y += 2 * line_conflicts(lines, y * size_x, line_counts[y], longest)
+            for x in range(0, size_x):
+                distance_x += 2 * line_conflicts(lines, rows_size + x * size_y, line_counts[size_y + x], longest)
+
+        steps_x = (distance_x + board.size_x - 2) // (board.size_x - 1)
+        steps_y = (distance_y + board.size_y - 2) // (board.size_y - 1)
+        return max(steps_x + steps_y, 2 * max(steps_x, steps_y) - 1)
+
+# ----- TranspositionTable -----
+# Remembers the shallowest depth at which a depth first search reached a state, so that the
+# same state reached again through another order of steps at the same or a greater depth
+# is not searched again. As the steps alternate their axis, the axis of the last step is part of the key.
+# To fit into the memory of the EV3, at most capacity states are stored, when full
+#  "deepest" - drops the state reached at the greatest depth, which prunes the least
+#  "clear" - drops all states
+#  "keep" - stores no further states
+class TranspositionTable:
+    def __init__(self, capacity: int = 100000, eviction: str = "deepest"):
+        if eviction not in ("deepest", "clear", "keep"):
+            raise Exception("Unknown eviction policy " + eviction)
+        self.capacity = capacity
+        self.eviction = eviction
+        self.reset()
+
+    # Drops all states and counters, before a new search
+    def reset(self):
+        self.clear()
+        self.hits = 0
+        self.pruned = 0
+        self.evictions = 0
+
+    # Drops all states, as they are only valid for one search bound
+    def clear(self):
+        self.depths = dict()
+        # the states stored per depth, might contain states that were reached at a smaller depth since
+        self.by_depth = list()
+
+    @staticmethod
+    def key(state: PackedPuzzleState, prev_step: Step) -> int:
+        return (state.board.key(state.value, state.free_pos) << 1) | (1 if prev_step.direction.is_x() else 0)
+
+    # Returns False if the state was already reached at the same or a smaller depth
+    def visit(self, key: int, depth: int) -> bool:
+        seen = self.depths.get(key)
+        if seen != None:
+            self.hits += 1
+            if seen <= depth:
+                self.pruned += 1
+                return False
+        elif len(self.depths) >= self.capacity and not self.evict():
+            return True
+
+        self.depths[key] = depth
+        if self.eviction == "deepest":
+            while len(self.by_depth) <= depth:
+                self.by_depth.append(list())
+            self.by_depth[depth].append(key)
+        return True
+
+    def evict(self) -> bool:
+        if self.eviction == "keep":
+            return False
+
+        self.evictions += 1
+        if self.eviction == "clear":
+            self.clear()
+            return True
+
+        for depth in range(len(self.by_depth) - 1, -1, -1):
+            keys = self.by_depth[depth]
+            while len(keys) > 0:
+                key = keys.pop()
+                if self.depths.get(key) == depth:
+                    del self.depths[key]
+                    return True
+        return False
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "pruned": self.pruned,
+            "entries": len(self.depths),
+            "evictions": self.evictions
+        }
+
+# ----- StepCost -----
+# The cost of executing steps, minimized by PuzzleSolver.solve_fastest.
+# The cost of a step might depend on the steps before (e.g. the position of the lifter on the robot),
+# which is carried from step to step as the motion state. This counts steps, see motion.py for the robot
+class StepCost:
+    # The motion state before the first step
+    def initial(self):
+        return None
+
+    # Returns the cost of the step applied to a state with the free field at free_pos,
+    # and the motion state after it
+    def step(self, motion, free_pos: int, step: Step):
+        return (1, motion)
+
+    # A lower bound of the cost of any step, to estimate the remaining cost
+    def min_step(self):
+        return 1
+
+    def sequence(self, sequence: StepSequence, puzzle: PuzzleState) -> int:
+        state = puzzle.copy()
+        motion = self.initial()
+        total = 0
+        for step in sequence.steps:
+            cost, motion = self.step(motion, state.free_pos, step)
+            total += cost
+            state.apply(step)
+        return total
+
+# ----- SolverStats -----
+# Instrumentation of a search, available as PuzzleSolver.stats after each solve
+# and passed to PuzzleSolver.progress while searching
+class SolverStats:
+    def __init__(self, callback = None, interval: int = 10000):
+        self.callback = callback
+        self.interval = interval
+        self.start_time = time_ms()
+        # the depth (or bound) the current round searches to
+        self.bound = 0
+        self.node_count = 0
+        self.nodes_per_depth = list()
+        # the number of states whose following states were visited
+        self.expanded = 0
+        self.solutions_found = 0
+        self.solutions_improved = 0
+        # per iterative deepening round the bound, the duration and the visited states
+        self.rounds = list()
+        self.round_start = None
+
+    # Counts a visited state at the depth, and reports the progress every interval states
+    def visit(self, depth: int):
+        while len(self.nodes_per_depth) <= depth:
+            self.nodes_per_depth.append(0)
+        self.nodes_per_depth[depth] += 1
+        self.node_count += 1
+        if self.callback != None and self.node_count % self.interval == 0:
+            self.callback(self)
+
+    def found(self, improved: bool):
+        self.solutions_found += 1
+        if improved:
+            self.solutions_improved += 1
+
+    def start_round(self, bound: int):
+        self.bound = bound
+        self.round_start = (time_ms(), self.node_count)
+        if self.callback != None:
+            self.callback(self)
+
+    def end_round(self):
+        start_time, start_count = self.round_start
+        self.rounds.append({
+            "bound": self.bound,
+            "duration": time_ms() - start_time,
+            "nodes": self.node_count - start_count
+        })
+
+    def duration(self) -> int:
+        return time_ms() - self.start_time
+
+    # The average number of following states of an expanded state
+    def branching_factor(self) -> float:
+        if self.expanded == 0:
+            return 0
+        return (self.node_count - (self.nodes_per_depth[0] if len(self.nodes_per_depth) > 0 else 0)) / self.expanded
+
+    def nodes_per_second(self) -> int:
+        duration = self.duration()
+        return self.node_count * 1000 // duration if duration > 0 else 0
+
+    def to_dict(self):
+        return {
+            "bound": self.bound,
+            "nodes": self.node_count,
+            "nodes_per_depth": self.nodes_per_depth,
+            "nodes_per_second": self.nodes_per_second(),
+            "branching_factor": round(self.branching_factor(), 2),
+            "solutions_found": self.solutions_found,
+            "solutions_improved": self.solutions_improved,
+            "rounds": self.rounds
+        }
+
+# ----- SearchCore -----
+# The depth first search of the solvers, without recursion and without allocating objects per visited state.
+# The search walks the moves of the board (see Board.move_table) with an explicit stack - each level keeps the packed value
+# and the position of the free field of its state, the moves to try and the index of the next one, in lists that are
+# allocated once for the deepest level.
+# Taking a move back is returning to the level above, so no inverse step is needed
+SEARCH_LEVELS = 32
+# The visited states between two calls of poll
+POLL_INTERVAL = 1024
+
+class SearchCore:
+    def __init__(self, board: Board = None):
+        self.board = board if board != None else BOARD
+        self.width = max(len(moves) for moves in self.board.child_moves)
+        self.levels = 0
+        self.grow(SEARCH_LEVELS)
+        # the moves of the best path found by the last search, or None
+        self.solution = None
+        # whether poll stopped the last search
+        self.stopped = False
+        self.node_count = 0
+
+    def grow(self, levels: int):
+        if levels <= self.levels:
+            return
+        self.values = [0] * levels
+        self.frees = [0] * levels
+        # the move that reached each level
+        self.moves = [0] * levels
+        self.children = [()] * levels
+        self.counts = [0] * levels
+        self.indices = [0] * levels
+        # with ordered, the moves of each level sorted by the estimate after them
+        self.ordered = [[0] * self.width for level in range(0, levels)]
+        self.estimates = [[0] * self.width for level in range(0, levels)]
+        self.levels = levels
+
+    # The Steps of the moves up to the level
+    def path(self, depth: int, start_depth: int = 0):
+        return [self.board.move_steps[self.moves[level]] for level in range(start_depth + 1, depth + 1)]
+
+    # Searches the paths from the state (the packed value with the free field at free_pos) to the target
+    # (the packed value with the free field at target_free).
+    # A state is not expanded if its depth plus the estimate of the heuristic (0 without one) exceeds the bound.
+    # first - stops at the first solution, otherwise searches on for shorter solutions, with the bound
+    #   returned by on_solution(depth) (by default depth - 1) once one is found
+    # ordered - follows the moves with the lowest estimate first, and skips the moves that exceed the bound
+    # poll - called with the bound every POLL_INTERVAL visited states, returns the bound to go on with or None to stop
+    # prev_move - the move that reached the state, whose axis the first move alternates, depth - the depth of the state
+    # Returns the smallest depth plus estimate that exceeded the bound, or None if there is none.
+    # The path to the best solution is kept in solution
+    def search(self, value: int, free_pos: int, target: int, target_free: int, bound: int, heuristic = None,
+               transpositions: TranspositionTable = None, stats: SolverStats = None, first: bool = True,
+               ordered: bool = False, on_solution = None, poll = None, prev_move: int = None, depth: int = 0):
+        board = self.board
+        keep = board.move_keep
+        mask = board.move_mask
+        left = board.move_left
+        right = board.move_right
+        move_free = board.move_free
+        move_x = board.move_x
+        move_children = board.move_children
+        key_mask = board.key_mask
+        pos_bits = board.pos_bits
+        estimate_of = heuristic.estimate if heuristic != None else None
+
+        start_depth = depth
+        self.grow(max(bound, start_depth) + 2)
+        values = self.values
+        frees = self.frees
+        moves = self.moves
+        children = self.children
+        counts = self.counts
+        indices = self.indices
+        if stats == None:
+            stats = SolverStats()
+        nodes_per_depth = stats.nodes_per_depth
+        depth_count = len(nodes_per_depth)
+        while len(nodes_per_depth) < self.levels:
+            nodes_per_depth.append(0)
+        node_count = stats.node_count
+        first_node = node_count
+        expanded = 0
+        callback = stats.callback
+        interval = stats.interval
+
+        self.solution = None
+        self.stopped = False
+        best = None
+        minimum = None
+        values[depth] = value
+        frees[depth] = free_pos
+        moves[depth] = prev_move if prev_move != None else -1
+        entering = True
+        while depth >= start_depth:
+            if entering:
+                entering = False
+                value = values[depth]
+                free = frees[depth]
+                node_count += 1
+                nodes_per_depth[depth] += 1
+                if callback != None and node_count % interval == 0:
+                    stats.node_count = node_count
+                    callback(stats)
+                if poll != None and node_count % POLL_INTERVAL == 0:
+                    bound = poll(bound)
+                    if bound == None:
+                        self.stopped = True
+                        break
+
+                if value == target and free == target_free:
+                    if best == None or depth < best:
+                        best = depth
+                        self.solution = self.path(depth, start_depth)
+                        stats.found(True)
+                        if first:
+                            break
+                        bound = on_solution(depth) if on_solution != None else depth - 1
+                    depth -= 1
+                    continue
+
+                estimate = depth + estimate_of(value, free) if estimate_of != None else depth
+                if estimate > bound:
+                    if minimum == None or estimate < minimum:
+                        minimum = estimate
+                    depth -= 1
+                    continue
+
+                expanded += 1
+                move = moves[depth]
+                level_moves = move_children[move] if move >= 0 else board.child_moves[free_pos * 3]
+                if ordered:
+                    # insertion sort into the lists of the level, stable like sorted
+                    level_ordered = self.ordered[depth]
+                    level_estimates = self.estimates[depth]
+                    count = 0
+                    for move in level_moves:
+                        child = (value & keep[move]) | (((value & mask[move]) << left[move]) >> right[move])
+                        child_estimate = estimate_of(child, move_free[move]) if estimate_of != None else 0
+                        i = count
+                        while i > 0 and level_estimates[i - 1] > child_estimate:
+                            level_ordered[i] = level_ordered[i - 1]
+                            level_estimates[i] = level_estimates[i - 1]
+                            i -= 1
+                        level_ordered[i] = move
+                        level_estimates[i] = child_estimate
+                        count += 1
+                    children[depth] = level_ordered
+                    counts[depth] = count
+                else:
+                    children[depth] = level_moves
+                    counts[depth] = len(level_moves)
+                indices[depth] = 0
+
+            i = indices[depth]
+            if i >= counts[depth]:
+                depth -= 1
+                continue
+            indices[depth] = i + 1
+            move = children[depth][i]
+            if ordered and depth + 1 + self.estimates[depth][i] > bound:
+                # the bound might have shrunk while searching the previous moves
+                indices[depth] = counts[depth]
+                continue
+            value = values[depth]
+            child = (value & keep[move]) | (((value & mask[move]) << left[move]) >> right[move])
+            # the key of TranspositionTable.key
+            if transpositions != None and not transpositions.visit(
+                    ((((child & key_mask) << pos_bits) | move_free[move]) << 1) | move_x[move], depth):
+                continue
+            depth += 1
+            values[depth] = child
+            frees[depth] = move_free[move]
+            moves[depth] = move
+            entering = True
+
+        stats.node_count = node_count
+        stats.expanded += expanded
+        self.node_count = node_count - first_node
+        # drops the levels that were not reached
+        while len(nodes_per_depth) > depth_count and nodes_per_depth[-1] == 0:
+            nodes_per_depth.pop()
+        return minimum
+
 class PuzzleSolver:
-    def __init__(self, puzzle: PuzzleState, target: PuzzleState = PuzzleState()):
+    # target - by default the target of the board of the puzzle
+    def __init__(self, puzzle: PuzzleState, target: PuzzleState = None):
         self.puzzle = puzzle
-        self.target = target
+        self.target = target if target != None else PuzzleState(puzzle.board.target, puzzle.board)
         self.solution = None
+        # The cost of the solution found by solve_fastest
+        self.solution_cost = None
+        # The SolverStats of the last solve
+        self.stats = SolverStats()
+        # Called with the SolverStats at the start of each round and every progress_interval visited states
+        self.progress = None
+        self.progress_interval = 10000
+
+    def start_stats(self) -> SolverStats:
+        self.stats = SolverStats(self.progress, self.progress_interval)
+        return self.stats
 
-    def solve_adaptive(self):
-        for max_depth in (5, 10, 15, 24):
-            self.solve(max_depth)
+    # Whether the puzzle can be solved at all, see validate_puzzle
+    def is_solvable(self) -> bool:
+        return validate_puzzle(self.puzzle.fields, self.target.fields, self.puzzle.board) == None
+
+    # The puzzle and the target as PackedPuzzleState
+    def packed(self):
+        return (PackedPuzzleState(self.puzzle.fields, board=self.puzzle.board),
+                PackedPuzzleState(self.target.fields, board=self.puzzle.board))
+
+    def solve_adaptive(self, transpositions: TranspositionTable = None):
+        stats = self.start_stats()
+        self.solution = None
+        if not self.is_solvable():
+            return
+        for max_depth in (5, 10, 15, self.puzzle.board.max_depth):
+            self.solve(max_depth, transpositions, stats)
             if self.solution != None:
                 return
 
-    def solve(self, max_depth: int):
-        if self.puzzle.fields == self.target.fields:
+    # Walks the precomputed SolutionTable from the puzzle to the target,
+    # which only takes one lookup per step of the solution
+    def solve_from_table(self, table: SolutionTable = None):
+        if table == None:
+            table = SolutionTable.load()
+        if table == None:
+            raise Exception("No solution table at " + TABLE_PATH + ", run build_table.py")
+        if tuple(self.target.fields) != TARGET_FIELDS:
+            raise Exception("The solution table only covers the default target")
+
+        self.solution = None
+        stats = self.start_stats()
+        if not self.is_solvable():
+            return
+
+        state = PuzzleState(self.puzzle.fields)
+        entry = table.entry(state.fields)
+        stats.visit(0)
+        if entry == TABLE_UNSOLVABLE:
+            return
+
+        steps = list()
+        distance = entry & 0x1F
+        while distance > 0:
+            step = SolutionTable.decode_step(entry)
+            steps.append(step)
+            state.apply(step)
+
+            entry = table.entry(state.fields)
+            stats.visit(len(steps))
+            if entry == TABLE_UNSOLVABLE or (entry & 0x1F) != distance - 1:
+                raise Exception("Corrupted solution table")
+            distance -= 1
+
+        stats.found(True)
+        self.solution = StepSequence(steps)
+
+    # Iterative deepening A* - a depth first search that prunes all paths whose length plus the
+    # estimated remaining steps exceeds a bound, which is raised to the smallest exceeding
+    # estimate until a solution is found. The first solution found is optimal.
+    # max_depth - the maximum number of steps of the solution, by default the max_depth of the board
+    # transpositions - an optional TranspositionTable to skip states reached again
+    def solve_ida(self, max_depth: int = None, heuristic: PuzzleHeuristic = None, transpositions: TranspositionTable = None):
+        if max_depth == None:
+            max_depth = self.puzzle.board.max_depth
+        if heuristic == None:
+            heuristic = PuzzleHeuristic(self.target)
+        if transpositions != None:
+            transpositions.reset()
+
+        self.solution = None
+        stats = self.start_stats()
+        if not self.is_solvable():
+            return
+        state, target = self.packed()
+        core = SearchCore(state.board)
+
+        bound = heuristic.estimate(state.value, state.free_pos)
+        while bound != None and bound <= max_depth:
+            stats.start_round(bound)
+            if transpositions != None:
+                transpositions.clear()
+            # the smallest estimate exceeding the bound is the next bound
+            bound = core.search(state.value, state.free_pos, target.value, target.free_pos, bound, heuristic, transpositions, stats)
+            stats.end_round()
+            if core.solution != None:
+                self.solution = StepSequence(core.solution)
+                return
+
+    # Anytime depth first branch and bound search - follows the steps with the lowest estimate first,
+    # so it finds a solution quickly, then only searches for strictly shorter ones.
+    # on_solution - called with each improved StepSequence as soon as it is found
+    # time_budget - the milliseconds after which the search stops and keeps the best solution so far
+    # returns True if the search completed, so the solution is optimal (or there is none within max_depth)
+    def solve_anytime(self, on_solution = None, time_budget: int = None, max_depth: int = None,
+                      heuristic: PuzzleHeuristic = None, transpositions: TranspositionTable = None):
+        if max_depth == None:
+            max_depth = self.puzzle.board.max_depth
+        if heuristic == None:
+            heuristic = PuzzleHeuristic(self.target)
+        if transpositions != None:
+            transpositions.reset()
+
+        self.solution = None
+        stats = self.start_stats()
+        if not self.is_solvable():
+            return True
+        deadline = stats.start_time + time_budget if time_budget != None else None
+        state, target = self.packed()
+        core = SearchCore(state.board)
+
+        # only solutions with at most bound steps are searched. The first solution may be twice as long,
+        # which is found much faster than one within max_depth, then the bound drops to max_depth
+        def found(depth: int) -> int:
+            self.solution = StepSequence(core.path(depth))
+            if on_solution != None:
+                on_solution(self.solution)
+            return min(depth - 1, max_depth)
+
+        def poll(bound: int):
+            return bound if time_ms() < deadline else None
+
+        stats.start_round(max_depth)
+        core.search(state.value, state.free_pos, target.value, target.free_pos, 2 * max_depth + 1, heuristic, transpositions, stats,
+                    first=False, ordered=True, on_solution=found, poll=poll if deadline != None else None)
+        stats.end_round()
+        return not core.stopped
+
+    # A* search for the solution with the lowest cost (e.g. the predicted time on the robot) instead of
+    # the least steps, which sets solution_cost. The remaining cost is estimated as the remaining steps
+    # times the cost of the cheapest step, so the solution is optimal for the cost
+    def solve_fastest(self, cost: StepCost = None, heuristic: PuzzleHeuristic = None):
+        if cost == None:
+            cost = StepCost()
+        if heuristic == None:
+            heuristic = PuzzleHeuristic(self.target)
+
+        self.solution = None
+        self.solution_cost = None
+        stats = self.start_stats()
+        if not self.is_solvable():
+            return
+
+        start, target = self.packed()
+        board = start.board
+        target = board.key(target.value, target.free_pos)
+        min_step = cost.min_step()
+
+        # For each reached (state key, motion state) the lowest cost, and the previous key and step
+        costs = dict()
+        previous = dict()
+        key = (board.key(start.value, start.free_pos), cost.initial())
+        costs[key] = 0
+        previous[key] = None
+        # (estimated total cost, cost, order, value, free_pos, motion state, depth)
+        queue = [(heuristic.estimate(start.value, start.free_pos) * min_step, 0, 0, start.value, start.free_pos, key[1], 0)]
+        order = 1
+        solved = False
+
+        stats.start_round(0)
+        while len(queue) > 0:
+            estimate, current, _, value, free_pos, motion, depth = heapq.heappop(queue)
+            key = (board.key(value, free_pos), motion)
+            if current > costs[key]:
+                continue
+            stats.visit(depth)
+            if key[0] == target:
+                stats.found(True)
+                solved = True
+                break
+
+            stats.expanded += 1
+            for move in board.child_moves[free_pos * 3]:
+                step = board.move_steps[move]
+                step_cost, next_motion = cost.step(motion, free_pos, step)
+                next_value = board.apply_move(value, move)
+                next_free = board.move_free[move]
+                next_key = (board.key(next_value, next_free), next_motion)
+                next_cost = current + step_cost
+                if next_cost < costs.get(next_key, next_cost + 1):
+                    costs[next_key] = next_cost
+                    previous[next_key] = (key, step)
+                    estimate = next_cost + heuristic.estimate(next_value, next_free) * min_step
+                    heapq.heappush(queue, (estimate, next_cost, order, next_value, next_free, next_motion, depth + 1))
+                    order += 1
+        stats.end_round()
+        if not solved:
+            return
+
+        steps = list()
+        while previous[key] != None:
+            key, step = previous[key]
+            steps.append(step)
+        steps.reverse()
+        self.solution = StepSequence(steps)
+        self.solution_cost = current
+
+    # Bidirectional breadth first search - expands the smaller frontier of the searches from
+    # the puzzle and from the target layer by layer, until both meet. Works for any target.
+    # max_depth - the maximum number of steps of the solution, by default the max_depth of the board
+    def solve_bidirectional(self, max_depth: int = None):
+        if max_depth == None:
+            max_depth = self.puzzle.board.max_depth
+        start, target = self.packed()
+
+        self.solution = None
+        stats = self.start_stats()
+        if not self.is_solvable():
+            return
+        if start == target:
             self.solution = StepSequence(list())
             return
-        
-        # print("solution search with depth " + str(max_depth) + " - about " + str(3 ** max_depth) + " possible paths")
+        board = start.board
 
-        best_solution = None
+        # For each reached state (by Board.key) the key of the previous state and the step from it, per direction
+        forward = { board.key(start.value, start.free_pos): None }
+        backward = { board.key(target.value, target.free_pos): None }
+        # the packed values and positions of the free field of the states reached last
+        forward_frontier = [(start.value, start.free_pos)]
+        backward_frontier = [(target.value, target.free_pos)]
 
-        current_path = list()
-        state = PuzzleState(self.puzzle.fields)
-        step_count = 0
+        # Expands all states of the frontier by one step,
+        # returns the next frontier and the first state also reached by the other search
+        def expand(frontier, reached, other):
+            next_frontier = list()
+            for value, free_pos in frontier:
+                stats.visit(depth)
+                stats.expanded += 1
+                key = board.key(value, free_pos)
+                for move in board.child_moves[free_pos * 3]:
+                    next_value = board.apply_move(value, move)
+                    next_key = board.key(next_value, board.move_free[move])
+                    if next_key in reached:
+                        continue
+                    reached[next_key] = (key, board.move_steps[move])
+                    if next_key in other:
+                        return (next_frontier, next_key)
+                    next_frontier.append((next_value, board.move_free[move]))
+            return (next_frontier, None)
 
-        def recurse(depth: int):
-            nonlocal max_depth
-            nonlocal current_path
-            nonlocal state
-            nonlocal step_count
-            nonlocal best_solution
+        # As both searches did not meet before, the first meeting point is on a shortest path
+        depth = 0
+        meeting = None
+        while meeting == None:
+            if depth >= max_depth or len(forward_frontier) == 0 or len(backward_frontier) == 0:
+                return
+            stats.start_round(depth + 1)
+            if len(forward_frontier) <= len(backward_frontier):
+                forward_frontier, meeting = expand(forward_frontier, forward, backward)
+            else:
+                backward_frontier, meeting = expand(backward_frontier, backward, forward)
+            stats.end_round()
+            depth += 1
 
-            if depth > max_depth:
-                return False
-            
-            for step in state.possibleSteps(current_path[-1] if len(current_path) > 0 else None):
-                step_count += 1
+        stats.found(True)
+        steps = list()
+        key = meeting
+        while forward[key] != None:
+            key, step = forward[key]
+            steps.append(step)
+        steps.reverse()
 
-                state.apply(step)
-                current_path.append(step)
-
-                # print(StepSequence(current_path).to_str())
-
-                if state.fields == self.target.fields:
-                    best_solution = current_path.copy()
-                    # print("Found solution after " + str(step_count) + " steps")
-                    # print(StepSequence(best_solution).to_str())
-
-                    max_depth = depth
-                    state.apply(step.inverse())
-                    current_path.pop()
-                    return False # continue to find better solution
-                
-                found = recurse(depth + 1)
-                if found:
-                    return True
-                
-                state.apply(step.inverse())
-                current_path.pop()
-            
-            return False
+        # Walk from the meeting point back to the target by inverting the steps of the backward search
+        key = meeting
+        while backward[key] != None:
+            key, step = backward[key]
+            steps.append(step.inverse())
+
+        self.solution = StepSequence(steps)
+
+    # Searches with a process pool (see parallel.py) where multiprocessing is available,
+    # otherwise (on MicroPython) falls back to the sequential IDA* search
+    def solve_parallel(self, max_depth: int = None, processes: int = None):
+        if max_depth == None:
+            max_depth = self.puzzle.board.max_depth
+        try:
+            from parallel import solve_parallel
+        except ImportError:
+            self.solve_ida(max_depth)
+            return
+        stats = self.start_stats()
+        self.solution = None
+        if not self.is_solvable():
+            return
+        self.solution, stats.node_count = solve_parallel(self.puzzle, self.target, max_depth, processes)
+
+    # Depth first search that also finds solutions with max_depth + 1 steps
+    # transpositions - an optional TranspositionTable to skip states reached again
+    # stats - the SolverStats to continue, when called as one round of a larger search
+    def solve(self, max_depth: int, transpositions: TranspositionTable = None, stats: SolverStats = None):
+        if transpositions != None:
+            transpositions.reset()
+        if stats == None:
+            stats = self.start_stats()
+
+        if self.puzzle.fields == self.target.fields:
+            self.solution = StepSequence(list())
+            return
         
-        recurse(0)
+        # print("solution search with depth " + str(max_depth) + " - about " + str(3 ** max_depth) + " possible paths")
 
-        if best_solution == None:
-            pass
-            # print("No solution found after " + str(step_count) + " steps, " + str(duration) + "ms")
-        else:
-            # print("Found solution after " + str(step_count) + " steps, " + str(duration) + "ms")
-            # print(StepSequence(best_solution).to_str())
-            self.solution = StepSequence(best_solution)
+        state, target = self.packed()
+        core = SearchCore(state.board)
+
+        # the states at max_depth are expanded, so that solutions with max_depth + 1 steps are found.
+        # Once a solution is found, only shorter ones are searched for
+        stats.start_round(max_depth)
+        core.search(state.value, state.free_pos, target.value, target.free_pos, max_depth, None, transpositions, stats, first=False)
+        stats.end_round()
+
+        if core.solution != None:
+            self.solution = StepSequence(core.solution)
 
 
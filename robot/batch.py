@@ -0,0 +1,115 @@
+import argparse
+import json
+import multiprocessing
+import sys
+from collections import deque
+from algorithm import PuzzleSolver, PuzzleState, SolutionTable, TARGET_FIELDS
+
+# Solves many puzzles at once with a process pool, e.g. to precompute the solutions for a deck of challenges
+# or to check solver changes on a large set of scrambles:
+#
+#   python batch.py scrambles.txt -o solutions.jsonl
+#
+# Reads one puzzle per line - either as digits ("123456780"), as numbers separated by commas or spaces,
+# or as JSON (a list of fields or an object with a "pattern"), and writes one JSON line per puzzle
+# with the "pattern", the "solution" (as StepSequence.to_str) and its "length" (both null if unsolvable).
+# A line that is no valid puzzle gets null for both and the reason in "error", the other lines are still solved
+
+# Solves a single puzzle in a worker process, returns (the solution as a string or None, the error or None)
+def solve_fields(fields):
+    try:
+        if isinstance(fields, str):
+            raise ValueError("Invalid puzzle " + fields)
+        solver = PuzzleSolver(PuzzleState(fields))
+        # the table only covers the 3x3 board with the default target
+        table = SolutionTable.load() if tuple(solver.target.fields) == TARGET_FIELDS else None
+        if table != None:
+            solver.solve_from_table(table)
+        else:
+            solver.solve_ida()
+    except Exception as e:
+        return (None, str(e))
+    return (solver.solution.to_str() if solver.solution != None else None, None)
+
+# Solves the puzzles with a pool of processes, yields (fields, solution, error) in the order of the puzzles
+# patterns - an iterable of fields (or the line for lines that could not be parsed), might be a stream
+# cache - a dict from the fields as tuple to (solution, error), shared across batches.
+#         Puzzles that are in the cache or already being solved are not solved again
+# window - the number of puzzles solved ahead of the ones yielded
+def solve_many(patterns, processes: int = None, cache: dict = None, window: int = 1024):
+    if cache == None:
+        cache = dict()
+
+    with multiprocessing.Pool(processes) as pool:
+        # the puzzles not yielded yet, in order, with their pending result (or None if cached)
+        pending = deque()
+        # the pending results by puzzle, to not solve duplicates twice
+        solving = dict()
+
+        def finish():
+            fields, key, result = pending.popleft()
+            if result != None:
+                cache[key] = result.get()
+                solving.pop(key, None)
+            solution, error = cache[key]
+            return (fields, solution, error)
+
+        for fields in patterns:
+            key = tuple(fields)
+            result = None
+            if key not in cache:
+                result = solving.get(key)
+                if result == None:
+                    result = pool.apply_async(solve_fields, (list(fields),))
+                    solving[key] = result
+            pending.append((fields if isinstance(fields, str) else list(fields), key, result))
+
+            while len(pending) > window or (len(pending) > 0 and (pending[0][2] == None or pending[0][2].ready())):
+                yield finish()
+
+        while len(pending) > 0:
+            yield finish()
+
+def parse_pattern(line: str):
+    if line.startswith("[") or line.startswith("{"):
+        value = json.loads(line)
+        return value["pattern"] if isinstance(value, dict) else value
+    if line.isdigit():
+        return [int(char) for char in line]
+    return [int(part) for part in line.replace(",", " ").split()]
+
+def read_patterns(lines):
+    for line in lines:
+        line = line.strip()
+        if line == "" or line.startswith("#"):
+            continue
+        try:
+            yield parse_pattern(line)
+        except (ValueError, KeyError, TypeError):
+            yield line
+
+def main():
+    parser = argparse.ArgumentParser(description="Solves sliding puzzles in batch and writes the solutions as JSON lines")
+    parser.add_argument("input", nargs="?", default="-", help="file with one puzzle per line, - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="file to write the solutions to, - for stdout")
+    parser.add_argument("-p", "--processes", type=int, default=None, help="number of worker processes (default: all cores)")
+    args = parser.parse_args()
+
+    input_file = sys.stdin if args.input == "-" else open(args.input, "r")
+    output_file = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        for fields, solution, error in solve_many(read_patterns(input_file), args.processes):
+            output_file.write(json.dumps({
+                "pattern": fields,
+                "solution": solution,
+                "length": len(solution.split()) if solution != None else None,
+                "error": error
+            }) + "\n")
+    finally:
+        if input_file != sys.stdin:
+            input_file.close()
+        if output_file != sys.stdout:
+            output_file.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+from algorithm import Board, PuzzleSolver, PuzzleState, SolutionTable, StepSequence, TranspositionTable
+from motion import MotionCost
+from patterndb import PatternDatabaseHeuristic, PATTERNDB_PATH
+from ui import TEMPLATES
+
+# Benchmarks the solver strategies on a reproducible corpus of puzzles, on a computer:
+#
+#   python benchmark.py -o results.json
+#   python benchmark.py --baseline results.json    # after changing the solver
+#   python benchmark.py --board 4x4 --lengths 20,30 -s ida-pdb --patterndb patterndb --no-memory
+#
+# The corpus consists of puzzles shuffled by StepSequence.fillRandom with a fixed seed at several
+# lengths, the templates of the UI and the hardest puzzles. For each strategy and puzzle the wall time,
+# the number of visited states, the time the robot is predicted to need for the solution and the peak memory (measured in a second run with tracemalloc) are recorded.
+# With a baseline the corpus of the baseline is replayed, and changed solution lengths,
+# more visited states or slower runs (beyond the tolerance) are reported as regressions.
+# On other boards than 3x3 the corpus only has the shuffled puzzles, and ida-pdb uses the pattern databases
+# in the --patterndb directory (see build_patterndb.py) next to the ones it builds in memory
+
+# The hardest puzzles, which need 24 and 23 steps
+WORST_CASES = {
+    "worst-24": (1, 4, 7, 2, 0, 8, 3, 6, 5),
+    "worst-23a": (8, 6, 5, 7, 3, 1, 2, 0, 4),
+    "worst-23b": (8, 6, 5, 7, 0, 1, 2, 3, 4)
+}
+
+STRATEGIES = {
+    "dfs": lambda solver: solver.solve_adaptive(),
+    "dfs-tt": lambda solver: solver.solve_adaptive(TranspositionTable()),
+    "ida": lambda solver: solver.solve_ida(),
+    "ida-tt": lambda solver: solver.solve_ida(transpositions=TranspositionTable()),
+    "ida-pdb": lambda solver: solver.solve_ida(heuristic=PatternDatabaseHeuristic.for_target(solver.target, patterndb_path)),
+    "anytime": lambda solver: solver.solve_anytime(transpositions=TranspositionTable()),
+    "bidirectional": lambda solver: solver.solve_bidirectional(),
+    "fastest": lambda solver: solver.solve_fastest(MotionCost()),
+    "parallel": lambda solver: solver.solve_parallel(),
+    "table": lambda solver: solver.solve_from_table()
+}
+
+# The directory of the pattern databases for ida-pdb
+patterndb_path = PATTERNDB_PATH
+
+# The exhaustive depth first search takes minutes for long scrambles, so it is only run on request
+DEFAULT_STRATEGIES = ["ida", "ida-tt", "bidirectional", "table"]
+
+# Returns a list of (name, fields)
+def build_corpus(seed: int, lengths, count: int, board: Board = None):
+    random.seed(seed)
+    target = PuzzleState(board.target) if board != None else PuzzleState()
+    corpus = list()
+    for length in lengths:
+        for i in range(0, count):
+            sequence = StepSequence()
+            sequence.fillRandom(length, target)
+            puzzle = PuzzleState(target.fields, target.board)
+            sequence.apply(puzzle)
+            corpus.append(("random-" + str(length) + "-" + str(i), puzzle.fields))
+
+    if target.board.size_x != 3 or target.board.size_y != 3:
+        return corpus
+    for name, fields in TEMPLATES.items():
+        corpus.append(("template-" + name, list(fields)))
+    for name, fields in WORST_CASES.items():
+        corpus.append((name, list(fields)))
+    return corpus
+
+def run(strategy: str, fields, measure_memory: bool):
+    solver = PuzzleSolver(PuzzleState(fields))
+    start = time.perf_counter()
+    STRATEGIES[strategy](solver)
+    duration = time.perf_counter() - start
+
+    result = {
+        "strategy": strategy,
+        "length": len(solver.solution.steps) if solver.solution != None else None,
+        "time_ms": round(duration * 1000, 3),
+        "nodes": solver.stats.node_count,
+        "predicted_ms": MotionCost().sequence(solver.solution, PuzzleState(fields)) if solver.solution != None else None
+    }
+
+    if measure_memory:
+        solver = PuzzleSolver(PuzzleState(fields))
+        tracemalloc.start()
+        STRATEGIES[strategy](solver)
+        result["peak_kb"] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        tracemalloc.stop()
+
+    return result
+
+def benchmark(corpus, strategies, measure_memory: bool = True, log = None):
+    results = list()
+    for strategy in strategies:
+        for name, fields in corpus:
+            result = run(strategy, fields, measure_memory)
+            result["case"] = name
+            result["fields"] = fields
+            results.append(result)
+            if log != None:
+                log(strategy + " " + name + ": " + str(result["length"]) + " steps, " +
+                    str(result["time_ms"]) + "ms, " + str(result["nodes"]) + " nodes")
+    return results
+
+def summarize(results):
+    summary = dict()
+    for result in results:
+        entry = summary.setdefault(result["strategy"], { "time_ms": 0, "nodes": 0, "peak_kb": 0 })
+        entry["time_ms"] = round(entry["time_ms"] + result["time_ms"], 3)
+        entry["nodes"] += result["nodes"]
+        entry["peak_kb"] = max(entry["peak_kb"], result.get("peak_kb", 0))
+    return summary
+
+# Returns a list of regression descriptions
+def compare(results, baseline, tolerance: float):
+    regressions = list()
+    expected = dict()
+    for result in baseline:
+        expected[(result["strategy"], result["case"])] = result
+
+    for result in results:
+        before = expected.get((result["strategy"], result["case"]))
+        if before == None:
+            continue
+        name = result["strategy"] + " " + result["case"]
+        if result["length"] != before["length"]:
+            regressions.append(name + ": solution length " + str(before["length"]) + " -> " + str(result["length"]))
+        if result["nodes"] > before["nodes"]:
+            regressions.append(name + ": nodes " + str(before["nodes"]) + " -> " + str(result["nodes"]))
+        if result["time_ms"] > before["time_ms"] * (1 + tolerance) and result["time_ms"] - before["time_ms"] > 1:
+            regressions.append(name + ": time " + str(before["time_ms"]) + "ms -> " + str(result["time_ms"]) + "ms")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the puzzle solver strategies")
+    parser.add_argument("-o", "--output", help="file to write the results to as JSON")
+    parser.add_argument("-s", "--strategies", default=",".join(DEFAULT_STRATEGIES),
+                        help="comma separated strategies out of " + ", ".join(STRATEGIES.keys()))
+    parser.add_argument("--seed", type=int, default=42, help="seed of the random corpus")
+    parser.add_argument("--lengths", default="5,10,15,20", help="comma separated scramble lengths")
+    parser.add_argument("--count", type=int, default=5, help="number of scrambles per length")
+    parser.add_argument("--board", default="3x3", help="the board of the shuffled puzzles, e.g. 4x4")
+    parser.add_argument("--patterndb", default=PATTERNDB_PATH, help="the directory of the pattern databases for ida-pdb")
+    parser.add_argument("--no-memory", action="store_true", help="skip measuring the peak memory")
+    parser.add_argument("--baseline", help="results of a previous run, to replay its corpus and compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative slowdown reported as regression")
+    args = parser.parse_args()
+    global patterndb_path
+    patterndb_path = args.patterndb
+
+    strategies = args.strategies.split(",")
+    for strategy in strategies:
+        if strategy not in STRATEGIES:
+            parser.error("unknown strategy " + strategy)
+    if "table" in strategies and SolutionTable.load() == None:
+        print("No solution table, skipping the table strategy (run build_table.py)", file=sys.stderr)
+        strategies.remove("table")
+
+    baseline = None
+    if args.baseline != None:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        seen = set()
+        corpus = list()
+        for result in baseline["results"]:
+            if result["case"] not in seen:
+                seen.add(result["case"])
+                corpus.append((result["case"], result["fields"]))
+    else:
+        size_x, size_y = [int(size) for size in args.board.split("x")]
+        corpus = build_corpus(args.seed, [int(length) for length in args.lengths.split(",")], args.count, Board.get(size_x, size_y))
+
+    log = lambda line: print(line, file=sys.stderr)
+    results = benchmark(corpus, strategies, not args.no_memory, log)
+    report = {
+        "python": sys.version,
+        "seed": baseline["seed"] if baseline != None else args.seed,
+        "summary": summarize(results),
+        "results": results
+    }
+
+    if args.output != None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report["summary"], indent=2))
+
+    if baseline != None:
+        regressions = compare(results, baseline["results"], args.tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression, file=sys.stderr)
+        if len(regressions) > 0:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import argparse
+import os
+import time
+from algorithm import Board, PuzzleState, FREE_FIELD
+from patterndb import PatternDatabase, PATTERNDB_PATH, ordered_groups
+
+# Builds the pattern databases of patterndb.py offline (run on a workstation, then download them to the EV3):
+#
+#   python build_patterndb.py 4x4                      # the rows, 4 tiles each (about a minute)
+#   python build_patterndb.py 4x4 --groups 1,2,5,6/3,4,7,8/9,10,13,14/11,12,15
+#
+# Each group of tiles is written into its own file, one byte per placement of its tiles and the free field.
+# PatternDatabaseHeuristic.for_target picks the files that fit the target and builds the missing groups in memory.
+# On the 4x4 board the rows visit fewer states than the 2x2 squares, as their mirrored lookup differs
+
+def build_patterndb(board: Board, groups, directory: str = PATTERNDB_PATH):
+    target = PuzzleState(board.target)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    for group in groups:
+        start = time.time()
+        target_positions = [target.fields.index(tile) for tile in group]
+        database = PatternDatabase.build(board, target_positions, board.target.index(FREE_FIELD), print)
+        path = database.save(directory)
+        print("Wrote tiles " + ",".join(str(tile) for tile in group) + " to " + path + " ("
+            + str(len(database.data)) + " bytes, " + str(round(time.time() - start, 1)) + "s)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Builds disjoint pattern databases")
+    parser.add_argument("size", help="the board, e.g. 4x4")
+    parser.add_argument("--groups", help="the tiles of each database, e.g. 1,2,5,6/3,4,7,8 (by default the tiles in order)")
+    parser.add_argument("--group-size", type=int, default=4, help="the tiles in each group of tiles in order")
+    parser.add_argument("-o", "--output", default=PATTERNDB_PATH, help="the directory to write the databases to")
+    args = parser.parse_args()
+
+    size_x, size_y = [int(size) for size in args.size.split("x")]
+    board = Board.get(size_x, size_y)
+    if args.groups != None:
+        groups = [[int(tile) for tile in group.split(",")] for group in args.groups.split("/")]
+    else:
+        groups = ordered_groups(PuzzleState(board.target), args.group_size)
+    build_patterndb(board, groups, args.output)
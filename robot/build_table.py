@@ -0,0 +1,39 @@
+import sys
+from algorithm import PuzzleState, SolutionTable, TARGET_FIELDS, TABLE_PATH, TABLE_SIZE, TABLE_UNSOLVABLE, permutation_rank
+
+# Builds the SolutionTable offline (run on a workstation, then download it to the EV3)
+#
+# Does one breadth-first search backwards from the target state. Every state is reached
+# first on a shortest path, and the inverse of the step that reached it leads back towards the target
+
+def build_table(path: str = TABLE_PATH):
+    table = bytearray([TABLE_UNSOLVABLE]) * TABLE_SIZE
+    table[permutation_rank(TARGET_FIELDS)] = SolutionTable.encode(None, 0)
+
+    frontier = [PuzzleState(TARGET_FIELDS)]
+    distance = 0
+    count = 1
+    while len(frontier) > 0:
+        distance += 1
+        next_frontier = list()
+        for state in frontier:
+            for step in state.possibleSteps():
+                next_state = PuzzleState(state.fields)
+                next_state.apply(step)
+                rank = permutation_rank(next_state.fields)
+                if table[rank] != TABLE_UNSOLVABLE:
+                    continue
+                table[rank] = SolutionTable.encode(step.inverse(), distance)
+                next_frontier.append(next_state)
+
+        count += len(next_frontier)
+        frontier = next_frontier
+        print("depth " + str(distance) + ": " + str(len(frontier)) + " states")
+
+    with open(path, "wb") as f:
+        f.write(table)
+
+    print("Wrote " + str(count) + " states to " + path)
+
+if __name__ == "__main__":
+    build_table(sys.argv[1] if len(sys.argv) > 1 else TABLE_PATH)
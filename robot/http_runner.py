@@ -1,12 +1,192 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
 from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+import ipc
 
 PATH = "/home/robot/robot/"
 
-index_file = ""
-with open(PATH + "index.html", "r") as f:
-    index_file = f.read().encode(encoding='utf_8')
+# The seconds a long-poll request waits for a new status, and after which the stream sends a keep-alive
+LONG_POLL_TIMEOUT = 20
+# The seconds between checks whether the motor controller wrote a new status
+WATCH_INTERVAL = 0.1
+# The number of status events kept for clients catching up, enough for a few games
+EVENT_LOG_SIZE = 512
+
+# The controller page, loaded once at startup
+class StaticPage:
+    def __init__(self, body: bytes, content_type: str = "text/html"):
+        self.content_type = content_type
+        self.body = body
+        self.gzip_body = gzip.compress(body, 9)
+        # strong ETags, one for each encoding of the page
+        digest = hashlib.sha1(body).hexdigest()
+        self.etag = '"' + digest + '"'
+        self.gzip_etag = '"' + digest + '-gzip"'
+
+    # Returns (etag, body, content encoding or None) for the Accept-Encoding header of the request
+    def select(self, accept_encoding: str):
+        encodings = [encoding.split(";")[0].strip() for encoding in (accept_encoding or "").split(",")]
+        if "gzip" in encodings:
+            return (self.gzip_etag, self.gzip_body, "gzip")
+        return (self.etag, self.body, None)
+
+    # Whether the If-None-Match header of the request names the etag, so the cached page is still valid
+    def is_cached(self, if_none_match: str, etag: str) -> bool:
+        if if_none_match == None:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+index_page = StaticPage(b"")
+
+# The latest status events, each with the id of the status version and the time it was received.
+# Older events are dropped once the log is full
+class EventLog:
+    def __init__(self, size: int = EVENT_LOG_SIZE):
+        self.events = deque(maxlen=size)
+
+    def append(self, id: int, status):
+        self.events.append({ "id": id, "time": int(time.time() * 1000), "status": status })
+
+    # Returns (events after the cursor, whether events after the cursor were already dropped)
+    def after(self, cursor: int = 0):
+        if len(self.events) == 0:
+            return ([], False)
+        first_id = self.events[0]["id"]
+        skip = max(0, cursor - first_id + 1)
+        return ([self.events[i] for i in range(skip, len(self.events))], cursor + 1 < first_id)
+
+# Watches the status file written by the motor controller, and wakes up the requests
+# waiting for a new version of it. The version counts the changes since the server started
+class StatusWatcher:
+    def __init__(self, path: str):
+        self.path = path
+        self.version = 0
+        self.status = { "status": "not running" }
+        self.file = ipc.JsonFile(path)
+        self.changed = threading.Condition()
+        self.log = EventLog()
+
+    # Reads the file if it changed, returns whether there is a new version
+    def poll(self):
+        text = self.file.text
+        try:
+            status = self.file.read()
+        except (OSError, ValueError):
+            # no file yet, or it is being written - read it on the next poll
+            return False
+        if self.file.text == text:
+            return False
+        return self.update(status)
+
+    # Sets the status read from the file or received through the channel.
+    # The version of the file only tells changes apart, the watcher counts its own versions
+    def update(self, status):
+        with self.changed:
+            if status == self.status:
+                return False
+            self.status = status
+            self.version += 1
+            self.log.append(self.version, status)
+            self.changed.notify_all()
+        return True
+
+    def watch(self):
+        while True:
+            self.poll()
+            time.sleep(WATCH_INTERVAL)
+
+    # Returns (version, status) once there is a version newer than since, or the current one after the timeout
+    def wait(self, since: int = None, timeout: float = LONG_POLL_TIMEOUT):
+        with self.changed:
+            if since != None:
+                self.changed.wait_for(lambda: self.version > since, timeout)
+            return (self.version, self.status)
+
+    # Returns the events after the cursor, waiting for the next one like wait
+    def events(self, cursor: int, timeout: float = LONG_POLL_TIMEOUT):
+        with self.changed:
+            self.changed.wait_for(lambda: self.version > cursor, timeout)
+            events, missed = self.log.after(cursor)
+            return { "events": events, "cursor": self.version, "missed": missed }
+
+    def to_json(self, version: int, status) -> str:
+        result = dict(status)
+        result["version"] = version
+        return json.dumps(result)
+
+watcher = StatusWatcher(PATH + "status.json")
+
+# The ipc.Channel to the connected motor controller, or None to pass commands through the file
+controller = None
+controller_lock = threading.Lock()
+
+# Accepts the motor controller on the socket and receives its status messages
+def serve_channel(path: str):
+    global controller
+    server = ipc.listen(path)
+    while True:
+        sock, _ = server.accept()
+        channel = ipc.Channel(sock)
+        with controller_lock:
+            if controller != None:
+                controller.close()
+            controller = channel
+        print("motor controller connected")
+
+        try:
+            while True:
+                for message in channel.receive(-1):
+                    if message["type"] == "status":
+                        watcher.update(message["body"])
+        except (OSError, ValueError):
+            pass
+
+        with controller_lock:
+            if controller == channel:
+                controller = None
+        channel.close()
+        print("motor controller disconnected")
+
+# Pushes the command to the motor controller, returns False if it is not connected
+def push_command(command) -> bool:
+    global controller
+    with controller_lock:
+        if controller == None:
+            return False
+        try:
+            controller.send("command", command)
+            return True
+        except OSError:
+            controller.close()
+            controller = None
+            return False
+
+# Without the channel, the motor controller reads the command file
+command_file = ipc.JsonFile(PATH + "command.json")
+command_lock = threading.Lock()
+
+# Writes the command with a version following the one in the file, which the motor controller keeps when it resets it
+def write_command(command):
+    with command_lock:
+        try:
+            version = command_file.read().get("version", 0)
+        except (OSError, ValueError):
+            version = 0
+        command = dict(command)
+        command["version"] = version + 1
+        command_file.write(command)
 
 class WebServer(BaseHTTPRequestHandler):
+    # keeps the connection open for the next request, which needs a Content-Length on every response
+    protocol_version = "HTTP/1.1"
+
     def set_cors(self):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
@@ -14,8 +194,13 @@ class WebServer(BaseHTTPRequestHandler):
         self.send_header("Access-Control-Allow-Headers", "Content-Type")
 
     def do_GET(self):
-        if self.path == "/status":
-            self.get_status()
+        path, _, query = self.path.partition("?")
+        if path == "/status":
+            self.get_status(query)
+        elif path == "/status/stream":
+            self.get_status_stream()
+        elif path == "/events":
+            self.get_events(query)
         else:
             self.get_index()
 
@@ -23,38 +208,116 @@ class WebServer(BaseHTTPRequestHandler):
         print("Do POST" + self.path)
         if self.path == "/command":
             self.post_command()
+        else:
+            # the body was not read, so the connection cannot take another request
+            self.close_connection = True
+            self.send_error(404)
 
     def do_OPTIONS(self):
         """ Answer CORS request """
         self.send_response(200, "ok")
         self.set_cors()
+        self.send_header('Content-Length', '0')
         self.end_headers()
-        
+
+    # The page is compressed once, and the browser revalidates its copy with the ETag on every load
     def get_index(self):
-        self.send_response(200)
+        etag, body, encoding = index_page.select(self.headers.get('Accept-Encoding'))
+        cached = index_page.is_cached(self.headers.get('If-None-Match'), etag)
+        self.send_response(304 if cached else 200)
         self.set_cors()
-        self.send_header('Content-Type', 'text/html')
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+        if cached:
+            self.end_headers()
+            return
+        self.send_header('Content-Type', index_page.content_type)
+        if encoding != None:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(body)))
         self.end_headers()
-        self.wfile.write(index_file)
+        self.wfile.write(body)
+
+    # Returns the number in the query parameter, or None
+    def query_int(self, query: str, parameter_name: str):
+        for parameter in query.split("&"):
+            name, _, value = parameter.partition("=")
+            if name == parameter_name and value.isdigit():
+                return int(value)
+        return None
 
-    def get_status(self):
+    def send_json(self, body: bytes):
         self.send_response(200)
         self.set_cors()
         self.send_header('Content-Type', 'application/json')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Content-Length', str(len(body)))
         self.end_headers()
+        self.wfile.write(body)
 
-        with open(PATH + "status.json", "r") as f:
-            self.wfile.write(f.read().encode(encoding='utf_8'))
+    # /status returns the current status, /status?since=<version> waits until there is a newer one
+    def get_status(self, query: str):
+        version, status = watcher.wait(self.query_int(query, "since"))
+        self.send_json(watcher.to_json(version, status).encode(encoding='utf_8'))
+
+    # /events?after=<cursor> returns all status events after the cursor (the id of the last event the client has),
+    # and the cursor to continue from. Waits like /status?since= if there are none yet
+    def get_events(self, query: str):
+        after = self.query_int(query, "after")
+        result = watcher.events(after if after != None else 0)
+        self.send_json(json.dumps(result).encode(encoding='utf_8'))
+
+    # Server-Sent Events with each new version of the status
+    def get_status_stream(self):
+        self.send_response(200)
+        self.set_cors()
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        # the stream has no length and ends with the connection
+        self.send_header('Connection', 'close')
+        self.close_connection = True
+        self.end_headers()
+
+        since = None
+        try:
+            while True:
+                version, status = watcher.wait(since)
+                if version == since:
+                    # keeps the connection open through proxies
+                    self.wfile.write(": keep-alive\n\n".encode(encoding='utf_8'))
+                else:
+                    event = "id: " + str(version) + "\ndata: " + watcher.to_json(version, status) + "\n\n"
+                    self.wfile.write(event.encode(encoding='utf_8'))
+                    since = version
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
 
     def post_command(self):
         command = self.rfile.read(int(self.headers['content-length'])).decode("utf-8")
         print("command: " + command)
-        with open(PATH + "command.json", "w") as f:
-            f.write(command)
+        command = json.loads(command)
+        if not push_command(command):
+            write_command(command)
+        body = "OK".encode(encoding='utf_8')
         self.send_response(200)
         self.set_cors()
+        self.send_header('Content-Length', str(len(body)))
         self.end_headers()
-        self.wfile.write("OK".encode(encoding='utf_8'))
+        self.wfile.write(body)
+
+# Handles each request in a thread, so that waiting and streaming clients do not block the others
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+if __name__ == "__main__":
+    with open(PATH + "index.html", "r") as f:
+        index_page = StaticPage(f.read().encode(encoding='utf_8'))
+
+    watcher.poll()
+    threading.Thread(target=watcher.watch, daemon=True).start()
+    threading.Thread(target=serve_channel, args=(PATH + ipc.SOCKET_NAME,), daemon=True).start()
 
-httpd = HTTPServer(('', 80), WebServer)
-httpd.serve_forever()
\ No newline at end of file
+    httpd = ThreadingServer(('', 80), WebServer)
+    httpd.serve_forever()
@@ -0,0 +1,152 @@
+import json
+
+try:
+    import os
+    import socket
+    import select
+    import time
+except ImportError:
+    import uos as os # MicroPython
+    import usocket as socket
+    import uselect as select
+    import utime as time
+
+# Message channel between the motor controller (main_ev3.py) and the web server (http_runner.py)
+# over a Unix domain socket in the working directory. The web server listens, the motor controller connects.
+# Each message is one line of JSON { "seq": <number>, "type": "status" | "command", "body": ... },
+# the sequence number counts the messages of the sender per connection.
+# If the channel cannot be opened (e.g. the runtime has no Unix sockets), both sides use the files instead,
+# which carry a "version" that increases with every write
+
+SOCKET_NAME = "ipc.sock"
+
+class Channel:
+    def __init__(self, sock):
+        self.sock = sock
+        self.poller = select.poll()
+        self.poller.register(sock, select.POLLIN)
+        self.buffer = b""
+        # the sequence number of the last sent and received message
+        self.sent_seq = 0
+        self.received_seq = 0
+
+    def send(self, type: str, body):
+        self.sent_seq += 1
+        data = (json.dumps({ "seq": self.sent_seq, "type": type, "body": body }) + "\n").encode()
+        while len(data) > 0:
+            data = data[self.sock.send(data):]
+
+    # Returns the messages received within timeout milliseconds (0 to not wait, -1 to wait forever),
+    # raises OSError once the other side closed the channel
+    def receive(self, timeout: int = 0):
+        messages = list()
+        while len(messages) == 0 and len(self.poller.poll(timeout)) > 0:
+            data = self.sock.recv(4096)
+            if len(data) == 0:
+                raise OSError("channel closed")
+            self.buffer += data
+            while b"\n" in self.buffer:
+                line, self.buffer = self.buffer.split(b"\n", 1)
+                message = json.loads(line.decode())
+                # drop repeated messages
+                if message["seq"] > self.received_seq:
+                    self.received_seq = message["seq"]
+                    messages.append(message)
+            timeout = 0
+        return messages
+
+    def close(self):
+        self.sock.close()
+
+# Returns a Channel to the web server, or None if it cannot be connected
+def connect(path: str = "./" + SOCKET_NAME):
+    sock = None
+    try:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(path)
+        return Channel(sock)
+    except Exception as e:
+        print("ipc: cannot connect to " + path + " (" + repr(e) + "), using the files")
+        if sock != None:
+            sock.close()
+        return None
+
+# Returns a listening socket, to accept a Channel for each connecting motor controller
+def listen(path: str):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    sock.bind(path)
+    # the web server runs as root, the motor controller as the robot user, which needs to write to the socket
+    os.chmod(path, 0o666)
+    sock.listen(1)
+    return sock
+
+# ----- File protocol -----
+# The status.json and command.json files in the working directory, used without the channel
+
+# Writes into a temporary file that then replaces the file, so that readers never see half written JSON.
+# Returns the written text
+def write_json(path: str, value) -> str:
+    text = json.dumps(value)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        f.write(text)
+    os.rename(temp_path, path)
+    return text
+
+# Identifies the version of a file without reading it - replacing the file changes the inode,
+# and most likely the modification time or size. None if there is no file
+def file_key(path: str):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat[1], stat[8], stat[6])
+
+# The seconds by which the modification time of a file has to be older than the read of it to tell every later
+# write apart by the key, as the time is kept in whole seconds (or two on FAT formatted SD cards)
+MTIME_RESOLUTION = 2
+
+# A JSON file written by write_json, that is only read again once its key changed, and only parsed again once its text changed.
+# The key alone does not tell all writes apart, as replacing the file alternates between two inodes - a reader that missed
+# two writes of the same size within the same second would see the key of the file it read before. So the key is only
+# trusted once the file was read at least MTIME_RESOLUTION seconds after it was modified, as any later write changes the time
+class JsonFile:
+    def __init__(self, path: str):
+        self.path = path
+        self.key = None
+        # the time before the file was last read
+        self.read_time = None
+        self.text = None
+        self.value = None
+        # the number of times the file was read
+        self.reads = 0
+
+    def is_unchanged(self, key) -> bool:
+        return key != None and key == self.key and key[1] + MTIME_RESOLUTION <= self.read_time
+
+    # Raises OSError if there is no file, and ValueError if it holds no JSON (then the value stays the same)
+    def read(self):
+        # the time is taken before the key, so that any write after the key has a later modification time
+        read_time = time.time()
+        key = file_key(self.path)
+        if self.is_unchanged(key):
+            return self.value
+        with open(self.path, "r") as f:
+            text = f.read()
+        self.reads += 1
+        if text != self.text:
+            self.value = json.loads(text)
+            self.text = text
+        self.key = key
+        self.read_time = read_time
+        return self.value
+
+    def write(self, value):
+        self.text = write_json(self.path, value)
+        self.value = value
+        # the file is read again on the next read, to take its key
+        self.key = None
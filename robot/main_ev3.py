@@ -10,29 +10,11 @@ from pybricks.parameters import Port, Button
 from pybricks.tools import wait, StopWatch
 from pybricks.media.ev3dev import Font
 
-import json
-
+import ipc
 from ui import PuzzleUI
-from algorithm import PuzzleState, Step, StepDirection, StepSequenceCursor, StepSequence
-
-# ------- Configuration --------------------
-# The angle the motor turns in each direction
-TILT_X = 220
-TILT_Y = 380
-# The speed in angle/s of the motor
-SPEED_X = 280
-SPEED_Y = 700
-# When turning back to the center position, the motor "overshoots" by this angle,
-# to account for slack in the gears
-OVERSHOOT_X = 40
-OVERSHOOT_Y = 50
-
-# The speed by which the lifter moves
-SPEED_LIFTER = 1200
-# The angle by which the lifter moves up or down
-OFFSET_LIFTER = 370
-# The time in seconds by which the robot waits for tiles to slide
-WAIT_FOR_SLIDE = 0.3
+from algorithm import PuzzleState, Step, StepDirection, StepSequenceCursor, StepSequence, validate_puzzle
+# The configuration of the motors is shared with the MotionCost that predicts their duration
+from motion import TILT_X, TILT_Y, SPEED_X, SPEED_Y, OVERSHOOT_X, OVERSHOOT_Y, SPEED_LIFTER, OFFSET_LIFTER, WAIT_FOR_SLIDE, is_level
 
 # Interface for the EV3 environment
 # This connects the abstract UI + algorithms to the EV3
@@ -44,6 +26,14 @@ class UIController:
     # Connected to an external Device, do not input via EV3
     controlled = False
 
+    # The EV3 has a single core, MicroPython has no multiprocessing
+    solve_processes = 1
+    # The milliseconds after which the robot starts moving with the best solution found so far
+    solve_time_budget = 10000
+    # Search the solution the robot executes fastest (see motion.py) instead of the one with the least steps,
+    # which takes several times longer to search
+    solve_fastest = False
+
     def __init__(self):
         small_font = Font(size=15, bold=True, monospace=True)
         self.ev3.screen.set_font(small_font)
@@ -56,6 +46,19 @@ class UIController:
         self.lifter.reset_angle(0)
         self.lock_even = None
 
+        # The targets the motors run to one after the other without blocking, as [motor, speed, targets]
+        self.motion_queue = list()
+        # The durations of the phases of each move in the current game, and of the last game
+        self.move_telemetry = list()
+        self.game_telemetry = list()
+
+        # The ipc.Channel to the web server while connected, and the commands it pushed
+        self.channel = None
+        self.commands = list()
+        # Without the channel, the status and command files
+        self.status_version = 0
+        self.command_file = ipc.JsonFile("./command.json")
+
     def init(self):
         while True:
             selection = self.select("Sliding Puzzle", ["Start", "Calibrate Axis", "Calibrate Lifter", "Connect"])
@@ -210,21 +213,36 @@ class UIController:
 
     # ------- Interface to Algorithm --------------------------
 
+    # The axis of the previous move returns to the center while the next move starts,
+    # see motion.py for which motors may move at the same time
     def do_move(self, step: Step, state: PuzzleState):
         self.interrupt_point()
         
         # Update status for external communication
-        self.write_status({
+        status = {
             "status": "move",
+            "move": len(self.move_telemetry),
+            "step": step.to_str(),
             "text": state.to_str(step)
-        })
+        }
+        if len(self.move_telemetry) > 0:
+            status["telemetry"] = self.move_telemetry[-1]
+        self.write_status(status)
+
+        start_time = self.time_ms()
+        # The lifter may move as soon as the board is level
+        self.wait_for_motion(lambda: is_level(self.axis_x.angle(), self.axis_y.angle()))
+        level_time = self.time_ms()
 
         # If the target is an even position, lock it.
         # This inversely unlocks all tiles moving to
         target_even = (state.free_pos % 2) == 0
         # Lock-Unlock to bring all tiles into proper position
-        self.lock(not target_even)
-        self.lock(target_even)
+        self.lock(not target_even, False)
+        self.lock(target_even, False)
+        # Tilting needs all tiles locked and the other axis at rest
+        self.wait_for_motion(lambda: not self.is_moving())
+        tilt_time = self.time_ms()
 
         if step.direction == StepDirection.UP:
             self.do_tilt_y(-TILT_Y)
@@ -234,6 +252,8 @@ class UIController:
             self.do_tilt_x(-TILT_X)
         elif step.direction == StepDirection.RIGHT:
             self.do_tilt_x(TILT_X)
+        # the tiles slide once the axis reached the tilt
+        tilted_time = self.time_ms()
         
         if step.move_count == 1:
             self.sleep(WAIT_FOR_SLIDE)
@@ -241,15 +261,28 @@ class UIController:
         for i in range(1, step.move_count):
             self.lock(not self.lock_even)
             self.sleep(WAIT_FOR_SLIDE)
+        slide_time = self.time_ms()
 
+        # Returns while the axis moves back to the center
         if step.direction.is_x():
-            self.reset_tilt_x()
+            self.reset_tilt_x(False)
         if step.direction.is_y():
-            self.reset_tilt_y()
+            self.reset_tilt_y(False)
+
+        self.move_telemetry.append({
+            "step": step.to_str(),
+            "level": level_time - start_time,
+            "lock": tilt_time - level_time,
+            "tilt": tilted_time - tilt_time,
+            "slide": slide_time - tilted_time,
+            "duration": slide_time - start_time
+        })
            
     def finish(self):
         self.reset_tilt()
         self.unlock()
+        self.game_telemetry = self.move_telemetry
+        self.move_telemetry = list()
         self.write_status({
             "status": "aborted"
         })
@@ -257,28 +290,37 @@ class UIController:
     def done(self, duration):
         self.write_status({
             "status": "finish",
-            "duration": duration
+            "duration": duration,
+            "telemetry": self.game_telemetry
         })
 
-    def solve_progress(self, search_depth, duration):
+    def solve_progress(self, search_depth, duration, stats = None):
         self.interrupt_point()
 
-        self.write_status({
+        status = {
             "status": "solve",
             "search_depth": search_depth,
             "duration": duration
-        })
-
-    def solve_failed(self):
-        self.write_status({
+        }
+        if stats != None:
+            status["stats"] = stats
+        self.write_status(status)
+
+    # problem - the reason returned by validate_puzzle, if known
+    def solve_failed(self, problem = None):
+        status = {
             "status": "solve-failed"
-        })
+        }
+        if problem != None:
+            status["problem"] = problem
+        self.write_status(status)
 
-    def solve_succeeded(self, solution_length, duration):
+    def solve_succeeded(self, solution_length, duration, predicted_duration = None):
         self.write_status({
             "status": "solve-succeeded",
             "duration": duration,
-            "solution_length": solution_length
+            "solution_length": solution_length,
+            "predicted_duration": predicted_duration
         })
 
     # ------- Axis Controller -------------------------------
@@ -295,52 +337,140 @@ class UIController:
         self.axis_y.run_angle(SPEED_Y, degree)
 
     def reset_tilt(self):
+        # let a pipelined reset of the last move finish first
+        self.wait_for_motion(lambda: not self.is_moving())
         self.reset_tilt_x()
         self.reset_tilt_y()
 
-    def reset_tilt_x(self):
+    # wait - whether to block until the axis is back in the center
+    def reset_tilt_x(self, wait = True):
         x_correction = -OVERSHOOT_X if self.axis_x.angle() > 0 else OVERSHOOT_X
-        self.axis_x.run_target(SPEED_X, x_correction)
-        self.axis_x.run_target(SPEED_X, 0)
+        self.queue_target(self.axis_x, SPEED_X, x_correction)
+        self.queue_target(self.axis_x, SPEED_X, 0)
+        if wait:
+            self.wait_for_motion(lambda: not self.is_moving(self.axis_x))
 
-    def reset_tilt_y(self):
+    def reset_tilt_y(self, wait = True):
         y_correction = -OVERSHOOT_Y if self.axis_y.angle() > 0 else OVERSHOOT_Y
-        self.axis_y.run_target(SPEED_Y, y_correction)
-        self.axis_y.run_target(SPEED_Y, 0)
+        self.queue_target(self.axis_y, SPEED_Y, y_correction)
+        self.queue_target(self.axis_y, SPEED_Y, 0)
+        if wait:
+            self.wait_for_motion(lambda: not self.is_moving(self.axis_y))
     
     # -------- Lifter Controller --------------------------------
 
-    def lock(self, even):
+    # wait - whether to block until the lifter reached the lock position
+    def lock(self, even, wait = True):
         if even == self.lock_even:
             return
 
         if even:
-            self.lifter.run_target(SPEED_LIFTER, -OFFSET_LIFTER)
+            self.queue_target(self.lifter, SPEED_LIFTER, -OFFSET_LIFTER)
         else:
-            self.lifter.run_target(SPEED_LIFTER, OFFSET_LIFTER)
+            self.queue_target(self.lifter, SPEED_LIFTER, OFFSET_LIFTER)
         
         self.lock_even = even
+        if wait:
+            self.wait_for_motion(lambda: not self.is_moving(self.lifter))
 
     def unlock(self):
-        self.lifter.run_target(SPEED_LIFTER, 0)
+        self.queue_target(self.lifter, SPEED_LIFTER, 0)
+        self.wait_for_motion(lambda: not self.is_moving(self.lifter))
+
+    # -------- Motion Queue --------------------------------
+    # Motors run to their targets with wait=False, so that independent motors move at the same time
+
+    def queue_target(self, motor, speed, target):
+        for entry in self.motion_queue:
+            if entry[0] is motor:
+                entry[2].append(target)
+                break
+        else:
+            self.motion_queue.append([motor, speed, [target]])
+        self.poll_motion()
+
+    # Starts the next target of each motor that reached its previous target
+    def poll_motion(self):
+        for entry in self.motion_queue:
+            motor, speed, targets = entry
+            if len(targets) > 0 and motor.control.done():
+                motor.run_target(speed, targets.pop(0), wait=False)
+        self.motion_queue = [entry for entry in self.motion_queue if len(entry[2]) > 0 or not entry[0].control.done()]
+
+    # Whether the motor (or any motor if None) has not reached its last target yet
+    def is_moving(self, motor = None):
+        for entry in self.motion_queue:
+            if motor == None or entry[0] is motor:
+                return True
+        return False
+
+    def wait_for_motion(self, condition):
+        self.poll_motion()
+        while not condition():
+            wait(5)
+            self.poll_motion()
 
     # ----------- Server Connection -----------------------
 
-    # Communicate with the http server via files
+    # Communicate with the http server via the ipc Channel, or via files if it cannot be connected
+
+    def close_channel(self):
+        self.channel.close()
+        self.channel = None
+        self.commands = list()
 
     def write_status(self, status):
-        with open("./status.json", "w") as f:
-            f.write(json.dumps(status))
+        if self.channel != None:
+            try:
+                self.channel.send("status", status)
+                return
+            except OSError:
+                self.close_channel()
+
+        self.status_version += 1
+        status = dict(status)
+        status["version"] = self.status_version
+        ipc.write_json("./status.json", status)
+
+    # Collects the commands the web server pushed, waiting at most timeout milliseconds for one
+    def receive_commands(self, timeout = 0):
+        try:
+            for message in self.channel.receive(timeout):
+                if message["type"] == "command":
+                    self.commands.append(message["body"])
+        except (OSError, ValueError):
+            self.close_channel()
 
     def read_command(self):
-        with open("./command.json", "r") as f:
-            return json.loads(f.read())
+        if self.channel != None:
+            self.receive_commands()
+        if self.channel != None:
+            return self.commands[0] if len(self.commands) > 0 else { "command": "wait" }
+
+        # only reads the file once the web server replaced it, or while it is too new to tell that by its stat
+        return self.command_file.read()
         
     def reset_command(self):
-        with open("./command.json", "w") as f:
-            f.write('{ "command": "wait" }')
+        if self.channel != None:
+            if len(self.commands) > 0:
+                self.commands.pop(0)
+            return
+
+        # keeps the version, so that the web server continues counting from it
+        version = self.command_file.value.get("version", 0) if self.command_file.value != None else 0
+        self.command_file.write({ "command": "wait", "version": version })
+
+    # Waits a second, or with the channel until the next command arrives
+    def wait_for_command(self):
+        if self.channel != None:
+            if len(self.commands) == 0:
+                self.receive_commands(1000)
+        else:
+            self.sleep(1)
 
     def connect(self):
+        if self.channel == None:
+            self.channel = ipc.connect()
         self.write_status({ "status": "waiting" })
         self.reset_command()
         self.controlled = True
@@ -355,7 +485,7 @@ class UIController:
                 if cmd == "solve":
                     self.reset_command()
                     self.connect_solve(command["pattern"])
-                if cmd == "apply":
+                elif cmd == "apply":
                     self.reset_command()
                     self.connect_solve(command["pattern"], command["solution"])
                 elif cmd == "reset":
@@ -365,18 +495,27 @@ class UIController:
                     pass
                 else:
                     raise Exception("Unknown command: " + cmd)
-                self.sleep(1)
+                self.wait_for_command()
         finally:
             self.controlled = False
             self.write_status({ "status": "not running" })
+            if self.channel != None:
+                self.close_channel()
     
-    def connect_solve(self, pattern, solution):
+    def connect_solve(self, pattern, solution = None):
+        # A bad scan fails right away, without waiting for a confirmation on the EV3
+        problem = validate_puzzle(pattern)
+        if problem != None:
+            self.solve_failed(problem)
+            return
+
         ui = PuzzleUI(self)
         ui.puzzle = PuzzleState(pattern)
 
         if solution is not None:
+            # Solutions from outside might contain steps the robot can skip
             ui.cursor = StepSequenceCursor(
-                StepSequence().from_str(solution),
+                StepSequence().from_str(solution).optimize(ui.puzzle),
                 ui.puzzle
             )
         try:
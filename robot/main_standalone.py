@@ -7,6 +7,12 @@ from time import time_ns, sleep
 
 # Interface to a regular python environment
 class UIController:
+    # Search solutions on all cores
+    solve_processes = os.cpu_count() or 1
+    # Search until the solution is optimal
+    solve_time_budget = None
+    solve_fastest = False
+
     def cls(self):
         os.system('cls' if os.name=='nt' else 'clear')
 
@@ -38,13 +44,15 @@ class UIController:
     def done(self, duration):
         pass
 
-    def solve_progress(self, duration, max_depth):
+    def solve_progress(self, duration, max_depth, stats = None):
         pass
 
-    def solve_failed(self):
+    def solve_failed(self, problem = None):
         pass
 
-    def solve_succeeded(self, duration, solution_depth):
+    def solve_succeeded(self, duration, solution_depth, predicted_duration = None):
         pass
 
-PuzzleUI(UIController()).init()
+# The guard keeps the worker processes of the parallel solver from starting the UI again
+if __name__ == "__main__":
+    PuzzleUI(UIController()).init()
@@ -0,0 +1,81 @@
+from algorithm import StepCost, Step
+
+# ------- Configuration --------------------
+# The angle the motor turns in each direction
+TILT_X = 220
+TILT_Y = 380
+# The speed in angle/s of the motor
+SPEED_X = 280
+SPEED_Y = 700
+# When turning back to the center position, the motor "overshoots" by this angle,
+# to account for slack in the gears
+OVERSHOOT_X = 40
+OVERSHOOT_Y = 50
+
+# The speed by which the lifter moves
+SPEED_LIFTER = 1200
+# The angle by which the lifter moves up or down
+OFFSET_LIFTER = 370
+# The time in seconds by which the robot waits for tiles to slide
+WAIT_FOR_SLIDE = 0.3
+
+# ------- Motion Cost --------------------
+# Predicts the milliseconds UIController.do_move takes for a step (see main_ev3.py),
+# from the angles and speeds of the motors. The motion state is the lock_even of the controller
+# and whether the previous step tilted the x axis
+class MotionCost(StepCost):
+    # pipelined - whether the lifter already moves while the previous axis returns to the center
+    def __init__(self, pipelined: bool = True):
+        # Tilting to one side, then back over the center by the overshoot and to the center again
+        self.tilt_x = (2 * TILT_X + 2 * OVERSHOOT_X) * 1000 // SPEED_X
+        self.tilt_y = (2 * TILT_Y + 2 * OVERSHOOT_Y) * 1000 // SPEED_Y
+        # The time the axis returns to the center once it is within the overshoot (see is_level),
+        # during which the lifter can move for the next step
+        self.level_x = 3 * OVERSHOOT_X * 1000 // SPEED_X if pipelined else 0
+        self.level_y = 3 * OVERSHOOT_Y * 1000 // SPEED_Y if pipelined else 0
+        # Moving the lifter from the center, or from one lock position to the other
+        self.lift_from_center = OFFSET_LIFTER * 1000 // SPEED_LIFTER
+        self.lift = 2 * OFFSET_LIFTER * 1000 // SPEED_LIFTER
+        self.wait = int(WAIT_FOR_SLIDE * 1000)
+
+    def initial(self):
+        return (None, None)
+
+    def lock(self, lock_even, even: bool):
+        if lock_even == even:
+            return 0
+        return self.lift_from_center if lock_even == None else self.lift
+
+    def step(self, motion, free_pos: int, step: Step):
+        lock_even, previous_x = motion
+        target_even = (free_pos % 2) == 0
+        lock = self.lock(lock_even, not target_even)
+        lock += self.lock(not target_even, target_even)
+        lock_even = target_even
+
+        # the return of the previous axis was already counted with the previous step
+        if previous_x != None:
+            lock = max(0, lock - (self.level_x if previous_x else self.level_y))
+
+        cost = lock + (self.tilt_x if step.direction.is_x() else self.tilt_y)
+        if step.move_count == 1:
+            cost += self.wait
+        for i in range(1, step.move_count):
+            cost += self.lift + self.wait
+            lock_even = not lock_even
+
+        return (cost, (lock_even, step.direction.is_x()))
+
+    # Each step moves the lifter at least once into the other lock position
+    def min_step(self):
+        return min(self.tilt_x, self.tilt_y) + max(0, self.lift - max(self.level_x, self.level_y)) + self.wait
+
+# ------- Safety --------------------
+# Which motors may move at the same time in the pipelined UIController.do_move:
+# - An axis only tilts while the lifter and the other axis are at rest, and the board is level
+# - The lifter may move while an axis returns to the center, once the axis is within its overshoot.
+#   The overshoot only takes up the slack of the gears, so the board is already level and
+#   tiles released by the lifter do not slide
+
+def is_level(angle_x: int, angle_y: int) -> bool:
+    return abs(angle_x) <= OVERSHOOT_X and abs(angle_y) <= OVERSHOOT_Y
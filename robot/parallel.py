@@ -0,0 +1,113 @@
+import multiprocessing
+from algorithm import Board, PackedPuzzleState, PuzzleHeuristic, PuzzleState, SearchCore, Step, StepSequence
+
+# Parallel solver for the standalone runtime (MicroPython has no multiprocessing)
+#
+# Splits the search tree into the subtrees below the first split_depth steps and searches them
+# with a process pool, as iterations of an IDA* search (see PuzzleSolver.solve_ida).
+# The workers share the length of the best solution found so far, and prune all paths
+# that cannot be shorter - so once one worker found a solution, the others stop early.
+# As all shorter bounds were searched before, the first solution found is optimal
+
+# The length of the best solution found by any worker, set per worker process by init_worker
+best_length = None
+
+def init_worker(shared_best_length):
+    global best_length
+    best_length = shared_best_length
+
+# Searches the subtree below the prefix steps for a solution shorter than best_length
+# task - (fields, target_fields, prefix, (size_x, size_y)) with the prefix as Step strings
+# returns the solution as a list of Step strings or None, the smallest estimated
+# solution length that exceeded the bound and the number of visited states
+def search_subtree(task):
+    fields, target_fields, prefix, size = task
+    board = Board.get(size[0], size[1])
+    state = PackedPuzzleState(fields, board=board)
+    prev_move = None
+    for step in prefix:
+        step = Step.from_str(step)
+        prev_move = board.move_index(state.free_pos, step)
+        state.apply(step)
+    target = PackedPuzzleState(target_fields, board=board)
+    heuristic = PuzzleHeuristic(PuzzleState(target_fields, board))
+    core = SearchCore(board)
+    solution = None
+
+    # only solutions shorter than best_length are searched, which other workers lower while searching
+    def found(depth: int) -> int:
+        nonlocal solution
+        with best_length.get_lock():
+            if depth < best_length.value:
+                best_length.value = depth
+                solution = prefix + [step.to_str() for step in core.path(depth, len(prefix))]
+            return best_length.value - 1
+
+    def poll(bound: int) -> int:
+        return min(bound, best_length.value - 1)
+
+    exceeded = core.search(state.value, state.free_pos, target.value, target.free_pos, best_length.value - 1, heuristic, first=False,
+                           on_solution=found, poll=poll, prev_move=prev_move, depth=len(prefix))
+    return (solution, exceeded, core.node_count)
+
+# All step sequences of length split_depth to search in parallel,
+# or a list with a single shorter solution if there is one
+def split(puzzle: PuzzleState, target: PuzzleState, split_depth: int):
+    target_state = PackedPuzzleState(target.fields, board=puzzle.board)
+    prefixes = [list()]
+    for depth in range(0, split_depth):
+        next_prefixes = list()
+        for prefix in prefixes:
+            state = PackedPuzzleState(puzzle.fields, board=puzzle.board)
+            for step in prefix:
+                state.apply(step)
+            for step in state.possibleSteps(prefix[-1] if len(prefix) > 0 else None):
+                next_prefix = prefix + [step]
+                if depth < split_depth - 1:
+                    state.apply(step)
+                    if state == target_state:
+                        return [next_prefix]
+                    state.apply(step.inverse())
+                next_prefixes.append(next_prefix)
+        prefixes = next_prefixes
+    return prefixes
+
+# Returns an optimal StepSequence with at most max_depth steps or None, and the number of visited states
+def solve_parallel(puzzle: PuzzleState, target: PuzzleState, max_depth: int = None, processes: int = None, split_depth: int = 2):
+    if max_depth == None:
+        max_depth = puzzle.board.max_depth
+    if puzzle.fields == target.fields:
+        return (StepSequence(list()), 0)
+
+    prefixes = split(puzzle, target, split_depth)
+    if len(prefixes) == 1 and len(prefixes[0]) < split_depth:
+        return (StepSequence(prefixes[0]), 0)
+
+    shared_best_length = multiprocessing.Value("i", 0)
+    size = (puzzle.board.size_x, puzzle.board.size_y)
+    tasks = [(list(puzzle.fields), list(target.fields), [step.to_str() for step in prefix], size) for prefix in prefixes]
+
+    total_node_count = 0
+    state = PackedPuzzleState(puzzle.fields, board=puzzle.board)
+    bound = max(split_depth, PuzzleHeuristic(target).estimate(state.value, state.free_pos))
+    with multiprocessing.Pool(processes, init_worker, (shared_best_length,)) as pool:
+        while bound <= max_depth:
+            # only search for solutions with at most bound steps
+            shared_best_length.value = bound + 1
+
+            best = None
+            next_bound = None
+            for solution, exceeded, node_count in pool.imap_unordered(search_subtree, tasks):
+                total_node_count += node_count
+                if solution != None and (best == None or len(solution) < len(best)):
+                    best = solution
+                if exceeded != None and (next_bound == None or exceeded < next_bound):
+                    next_bound = exceeded
+
+            if best != None:
+                return (StepSequence([Step.from_str(step) for step in best]), total_node_count)
+            if next_bound == None:
+                break
+            bound = next_bound
+
+    return (None, total_node_count)
@@ -0,0 +1,264 @@
+import argparse
+import os
+import sys
+from collections import deque
+import numpy as np
+from algorithm import SIZE_X, FREE_FIELD
+
+# Detects the pattern of the LEGO tiles in a camera frame, like analyzeRaster in controller/src/pattern.ts,
+# on a computer with NumPy. Each step works on the whole frame at once:
+#
+#   python pattern.py frames/             # prints the pattern found in each image
+#   python pattern.py --scan frames/      # scans the images as frames of a video, until the pattern is stable
+#
+# Images named after the expected pattern (e.g. 123456780.png or 123456780-dark.png) are checked against it,
+# so that a folder of scans serves as regression test. PNG and JPEG files need Pillow, .npy files
+# (an array of height x width x RGB(A)) are read with NumPy
+
+# The number of raster cells per tile in each direction
+PER_TILE = 3
+TILES = SIZE_X
+RASTER = TILES * PER_TILE
+
+# Maps the tiles to a 3x3 raster, where 1 means "contains yellow" (the last tile is the free field)
+MAPPING_IDS = np.array([1, 2, 3, 4, 5, 6, 7, 8])
+MAPPINGS = np.array([
+    [1, 1, 0,
+     1, 0, 0,
+     0, 0, 0],
+    [1, 1, 1,
+     0, 0, 0,
+     0, 0, 0],
+    [0, 1, 1,
+     0, 0, 1,
+     0, 0, 0],
+    [1, 0, 0,
+     1, 0, 0,
+     1, 0, 0],
+    [1, 1, 1,
+     1, 0, 1,
+     1, 1, 1],
+    [0, 0, 1,
+     0, 0, 1,
+     0, 0, 1],
+    [0, 0, 0,
+     1, 0, 0,
+     1, 1, 0],
+    [0, 0, 0,
+     0, 0, 0,
+     1, 1, 1]
+], dtype=bool)
+
+# A raster cell counts as yellow above, and as empty below this share of the yellow pixels
+YELLOW_SHARE = 0.1
+EMPTY_SHARE = 0.3
+
+# Returns a boolean array of the pixels that are yellow, for an array of height x width x RGB(A)
+def yellow_mask(image):
+    r = image[:, :, 0]
+    g = image[:, :, 1]
+    b = image[:, :, 2]
+    return (r > 140) & (g > 150) & (g < 240) & (b < 120)
+
+# Returns (min_x, min_y, max_x, max_y) of the smallest box that contains all yellow pixels, or None
+def yellow_box(mask):
+    columns = np.flatnonzero(mask.any(axis=0))
+    rows = np.flatnonzero(mask.any(axis=1))
+    if len(columns) == 0:
+        return None
+    return (int(columns[0]), int(rows[0]), int(columns[-1]), int(rows[-1]))
+
+# Assigns each of the length pixels to one of the RASTER cells, as a one-hot matrix of RASTER x length
+def raster_cells(length: int):
+    cells = np.minimum((np.arange(length) * RASTER) // max(length, 1), RASTER - 1)
+    return cells[np.newaxis, :] == np.arange(RASTER)[:, np.newaxis]
+
+# The pattern found in an image
+class PatternResult:
+    def __init__(self, pattern, confidence: float, raster, box):
+        # the fields as for PuzzleState, with FREE_FIELD where no tile matched
+        self.pattern = pattern
+        # from 0 to 1, how clearly the worst tile matched
+        self.confidence = confidence
+        # the share of yellow pixels in each of the RASTER x RASTER cells, times RASTER
+        self.raster = raster
+        self.box = box
+
+    # Whether each tile was found once, like isValidPattern in pattern.ts. The puzzle might still be unsolvable
+    def is_valid(self) -> bool:
+        return sorted(self.pattern) == list(range(TILES * TILES))
+
+# Finds the most likely tiles in the image (an array of height x width x RGB(A))
+def analyze_raster(image) -> PatternResult:
+    mask = yellow_mask(image)
+    return analyze_mask(mask, yellow_box(mask))
+
+# Finds the most likely tiles in the yellow mask of an image, and the box of it
+def analyze_mask(mask, box) -> PatternResult:
+    # (1) Zoom into the smallest box that contains all yellow pixels
+    if box == None:
+        return PatternResult([FREE_FIELD] * (TILES * TILES), 0.0, np.zeros((RASTER, RASTER)), None)
+    min_x, min_y, max_x, max_y = box
+    box_mask = mask[min_y:max_y, min_x:max_x].astype(np.float64)
+
+    # (2) Count the yellow pixels in each cell of the raster
+    rows = raster_cells(box_mask.shape[0]).astype(np.float64)
+    columns = raster_cells(box_mask.shape[1]).astype(np.float64)
+    raster = rows @ box_mask @ columns.T
+    total = raster.sum()
+    if total > 0:
+        raster = raster / total * RASTER
+
+    # (3) Compare the cells of each tile with each mapping
+    # tiles is TILES * TILES x PER_TILE * PER_TILE, in the order of the fields
+    tiles = raster.reshape(TILES, PER_TILE, TILES, PER_TILE).transpose(0, 2, 1, 3).reshape(TILES * TILES, PER_TILE * PER_TILE)
+    cells = tiles[:, np.newaxis, :]
+    matches = np.where(MAPPINGS, cells > YELLOW_SHARE, cells < EMPTY_SHARE).all(axis=2)
+    scores = np.where(MAPPINGS, cells, -cells).sum(axis=2)
+    scores = np.where(matches & (scores > 0), scores, 0)
+
+    order = np.argsort(-scores, axis=1)
+    best = scores[np.arange(len(scores)), order[:, 0]]
+    second = scores[np.arange(len(scores)), order[:, 1]]
+    pattern = np.where(best > 0, MAPPING_IDS[order[:, 0]], FREE_FIELD)
+
+    # A tile is clear if no other mapping matches, the free field if it is nearly empty
+    tile_confidence = np.where(best > 0, best / np.maximum(best + second, 1e-9),
+        np.clip(1 - tiles.max(axis=1) / EMPTY_SHARE, 0, 1))
+
+    return PatternResult([int(field) for field in pattern], float(tile_confidence.min()), raster, box)
+
+# Analyzes a batch of frames, e.g. of a video
+def analyze_frames(frames):
+    return [analyze_raster(frame) for frame in frames]
+
+# Scans a stream of frames (e.g. of a camera) for a pattern, like scanStream in pattern.ts.
+# Each frame votes for the tile on each field, and the scan stops once the last frames agree on a valid pattern.
+# Only analyzed frames vote. After each analysis, the next frames in which the yellow box did not move are skipped
+# without a vote, as they show the same tiles - so a misread frame is still outvoted by frames analyzed on their own.
+# Once the pattern is stable, all frames with the same box are skipped
+class FrameScanner:
+    # window - the number of the last analyzed frames that vote
+    # agreement - the votes the tile on each field needs
+    # box_tolerance - the pixels by which the box may move from the last analyzed frame for a frame to be skipped
+    # skip_frames - the frames with the same box that are skipped after each analysis, until the pattern is stable
+    def __init__(self, window: int = 5, agreement: int = 4, box_tolerance: int = 2, skip_frames: int = 1):
+        self.window = window
+        self.agreement = agreement
+        self.box_tolerance = box_tolerance
+        self.skip_frames = skip_frames
+        self.votes = deque(maxlen=window)
+        self.last = None
+        # the frames skipped since the last analysis
+        self.skipped = 0
+        # the stable pattern, until the box moves
+        self.result = None
+        # the number of frames seen, and of frames analyzed
+        self.frames = 0
+        self.analyzed = 0
+
+    def reset(self):
+        self.votes.clear()
+        self.last = None
+        self.skipped = 0
+        self.result = None
+
+    def is_same_box(self, box) -> bool:
+        if self.last == None or self.last.box == None or box == None:
+            return False
+        return max(abs(a - b) for a, b in zip(box, self.last.box)) <= self.box_tolerance
+
+    # Adds the frame, returns the PatternResult once the pattern is stable, otherwise None.
+    # Each vote comes from an analysis of its own frame, as the same box does not mean the same reading
+    # (e.g. a blurred or badly lit frame), so skipped frames do not repeat the vote of the last one
+    def process(self, image):
+        self.frames += 1
+        mask = yellow_mask(image)
+        box = yellow_box(mask)
+        if self.is_same_box(box) and (self.result != None or self.skipped < self.skip_frames):
+            self.skipped += 1
+            return self.result
+        self.last = analyze_mask(mask, box)
+        self.skipped = 0
+        self.analyzed += 1
+        self.votes.append(self.last.pattern)
+        self.result = self.stable()
+        return self.result
+
+    # The pattern with the most votes on each field, if all fields have enough votes and it is valid
+    def stable(self):
+        if len(self.votes) < self.agreement:
+            return None
+        votes = np.array(self.votes)
+        counts = (votes[:, :, np.newaxis] == np.arange(TILES * TILES)).sum(axis=0)
+        fields = counts.argmax(axis=1)
+        agreeing = counts.max(axis=1)
+        if agreeing.min() < self.agreement:
+            return None
+        # the confidence is the share of votes of the least clear field
+        result = PatternResult([int(field) for field in fields], float(agreeing.min()) / len(self.votes), self.last.raster, self.last.box)
+        return result if result.is_valid() else None
+
+    # Processes the frames until the pattern is stable, returns it or None if the frames ran out first
+    def scan(self, frames):
+        for frame in frames:
+            result = self.process(frame)
+            if result != None:
+                return result
+        return None
+
+def load_image(path: str):
+    if path.endswith(".npy"):
+        return np.load(path)
+    try:
+        from PIL import Image
+    except ImportError:
+        raise Exception("Reading " + path + " needs Pillow (pip install pillow)")
+    return np.asarray(Image.open(path).convert("RGB"))
+
+# Returns the pattern in the name of the file, or None
+def expected_pattern(path: str):
+    name = os.path.basename(path).split(".")[0].split("-")[0].split("_")[0]
+    if len(name) != TILES * TILES or not name.isdigit():
+        return None
+    return [int(char) for char in name]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detects the tile pattern in images")
+    parser.add_argument("paths", nargs="+", help="images, or folders of images")
+    parser.add_argument("--scan", action="store_true", help="scan the images as consecutive frames with a FrameScanner")
+    args = parser.parse_args()
+
+    files = list()
+    for path in args.paths:
+        if os.path.isdir(path):
+            files += [os.path.join(path, name) for name in sorted(os.listdir(path))
+                if name.lower().endswith((".png", ".jpg", ".jpeg", ".npy"))]
+        else:
+            files.append(path)
+
+    if args.scan:
+        scanner = FrameScanner()
+        result = scanner.scan(load_image(path) for path in files)
+        if result == None:
+            print("No stable pattern in " + str(scanner.frames) + " frames")
+            sys.exit(1)
+        print("".join(str(field) for field in result.pattern) + " after " + str(scanner.frames) + " frames, "
+            + str(scanner.analyzed) + " analyzed")
+        sys.exit(0)
+
+    failed = 0
+    for path in files:
+        result = analyze_raster(load_image(path))
+        line = path + ": " + "".join(str(field) for field in result.pattern) + " confidence " + str(round(result.confidence, 2))
+        if not result.is_valid():
+            line += " (invalid)"
+        expected = expected_pattern(path)
+        if expected != None and expected != result.pattern:
+            line += " - expected " + "".join(str(field) for field in expected)
+            failed += 1
+        print(line)
+
+    if failed > 0:
+        print(str(failed) + " of " + str(len(files)) + " images failed")
+        sys.exit(1)
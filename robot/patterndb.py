@@ -0,0 +1,354 @@
+try:
+    import os
+except ImportError:
+    import uos as os # MicroPython
+from algorithm import Board, PuzzleHeuristic, PuzzleState, FREE_FIELD
+
+# ----- Disjoint pattern databases -----
+# A heuristic for larger boards (e.g. the 15 puzzle on the 4x4 board), where the distances of
+# PuzzleHeuristic leave too many states to search:
+#
+#   solver.solve_ida(heuristic=PatternDatabaseHeuristic.for_target(solver.target))
+#
+# The tiles are split into disjoint groups. For each group a PatternDatabase holds, for every placement of its tiles
+# and the free field, the least cost to move the tiles of the group to their targets. All other fields hold some tile,
+# so a step that moves count tiles, of which some belong to the group, is known - and the cost of the step
+# is shared by the moved tiles, i.e. the group pays for its tiles cost_unit / count each.
+# The shares of all groups sum up to one step, so the sum of the costs of all groups is a lower bound of the steps.
+#
+# Databases of a few tiles are built in memory when needed. Larger ones are built offline by build_patterndb.py
+# into PATTERNDB_PATH, and memory mapped from there, so that only the pages the search looks at are read
+
+PATTERNDB_PATH = "./patterndb"
+
+# The entries of a database, which hold the cost in cost units
+MAX_COST = 0xFE
+UNREACHED = 0xFF
+
+# The cost of one step, which is divisible by any number of moved tiles
+def cost_unit(board: Board) -> int:
+    unit = 1
+    for count in range(2, board.max_step + 1):
+        a, b = unit, count
+        while b > 0:
+            a, b = b, a % b
+        unit = unit * count // a
+    return unit
+
+# Splits the tiles (by default all) into groups of group_size tiles, which have their targets close to each other -
+# each group starts with the first remaining tile (by target position) and adds the remaining tile
+# closest to the tiles of the group (by the sum of the squared distances), until it is full
+def compact_groups(target: PuzzleState, group_size: int = 3, tiles = None):
+    board = target.board
+    remaining = [pos for pos in range(0, board.size) if target.fields[pos] != FREE_FIELD
+        and (tiles == None or target.fields[pos] in tiles)]
+
+    def distance(a: int, b: int) -> int:
+        return (board.to_x(a) - board.to_x(b)) ** 2 + (board.to_y(a) - board.to_y(b)) ** 2
+
+    groups = list()
+    while len(remaining) > 0:
+        group = [remaining.pop(0)]
+        while len(group) < group_size and len(remaining) > 0:
+            closest = min(remaining, key=lambda pos: (sum(distance(pos, other) for other in group), pos))
+            remaining.remove(closest)
+            group.append(closest)
+        groups.append(tuple(sorted(target.fields[pos] for pos in group)))
+    return groups
+
+# Splits the tiles (by default all) into groups of group_size tiles in the order of their targets, e.g. the rows of the
+# 4x4 board. Unlike compact_groups on a square board, these groups are not mirrored into each other at the diagonal,
+# so the mirrored state of PatternDatabaseHeuristic has a cost of its own
+def ordered_groups(target: PuzzleState, group_size: int = 4, tiles = None):
+    ordered = [field for field in target.fields if field != FREE_FIELD and (tiles == None or field in tiles)]
+    return [tuple(sorted(ordered[i:i + group_size])) for i in range(0, len(ordered), group_size)]
+
+# The number of placements of count distinct positions out of size fields
+def placement_count(count: int, size: int) -> int:
+    result = 1
+    for i in range(0, count):
+        result *= size - i
+    return result
+
+# The index of distinct positions among all placements of as many positions out of size fields,
+# like permutation_rank: each position counts without the positions before it
+def placement_rank(positions, size: int) -> int:
+    rank = 0
+    for i in range(0, len(positions)):
+        pos = positions[i]
+        digit = pos
+        for j in range(0, i):
+            if positions[j] < pos:
+                digit -= 1
+        rank = rank * (size - i) + digit
+    return rank
+
+# The positions of the placement_rank
+def placement_positions(rank: int, count: int, size: int):
+    digits = [0] * count
+    for i in range(count - 1, -1, -1):
+        digits[i] = rank % (size - i)
+        rank //= size - i
+    positions = list()
+    for digit in digits:
+        pos = 0
+        while digit > 0 or pos in positions:
+            if pos not in positions:
+                digit -= 1
+            pos += 1
+        positions.append(pos)
+    return positions
+
+# The costs of a group of tiles with the targets target_positions, and the free field at free_pos.
+# The entries are indexed by placement_rank of the positions of the tiles followed by the free field,
+# and stay in the file at path until they are needed
+class PatternDatabase:
+    def __init__(self, board: Board, target_positions, free_pos: int, data = None, path: str = None):
+        self.board = board
+        self.target_positions = tuple(target_positions)
+        self.free_pos = free_pos
+        self.data = data
+        self.path = path
+        self.file = None
+
+    # Searches from the target, as a step moves the same tiles back when inverted.
+    # The costs are small, so the queue is a list of ranks for each cost, and the entries hold the best cost so far
+    @staticmethod
+    def build(board: Board, target_positions, free_pos: int, log = None):
+        unit = cost_unit(board)
+        count = len(target_positions) + 1
+        data = bytearray([UNREACHED]) * placement_count(count, board.size)
+        start = placement_rank(list(target_positions) + [free_pos], board.size)
+        data[start] = 0
+        queue = [[start]]
+
+        cost = 0
+        while cost < len(queue):
+            ranks = queue[cost]
+            # steps that move no tile of the group add to the list while it is processed
+            i = 0
+            while i < len(ranks):
+                rank = ranks[i]
+                i += 1
+                if data[rank] != cost:
+                    continue
+                positions = placement_positions(rank, count, board.size)
+                free = positions[-1]
+                for direction in range(0, 4):
+                    stride = board.strides[direction]
+                    moved = positions[:-1]
+                    group_tiles = 0
+                    for moves in range(1, board.moves[free * 4 + direction] + 1):
+                        pos = free - moves * stride
+                        if pos in moved:
+                            moved[moved.index(pos)] = pos + stride
+                            group_tiles += 1
+                        next_cost = min(cost + unit * group_tiles // moves, MAX_COST)
+                        moved.append(pos)
+                        next_rank = placement_rank(moved, board.size)
+                        moved.pop()
+                        if next_cost < data[next_rank]:
+                            data[next_rank] = next_cost
+                            while len(queue) <= next_cost:
+                                queue.append(list())
+                            queue[next_cost].append(next_rank)
+            queue[cost] = None
+            if log != None and len(ranks) > 0:
+                log("cost " + str(cost) + ": " + str(len(ranks)) + " placements")
+            cost += 1
+        return PatternDatabase(board, target_positions, free_pos, data)
+
+    # e.g. 4x4-0.1.4.5-15.bin for the tiles with the targets 0, 1, 4 and 5 and the free field at 15 on the 4x4 board
+    def file_name(self) -> str:
+        return (str(self.board.size_x) + "x" + str(self.board.size_y) + "-"
+            + ".".join(str(pos) for pos in self.target_positions) + "-" + str(self.free_pos) + ".bin")
+
+    def save(self, directory: str = PATTERNDB_PATH) -> str:
+        path = directory + "/" + self.file_name()
+        with open(path, "wb") as f:
+            f.write(self.data)
+        return path
+
+    # Returns the database in the file named by file_name, without reading it. None for other files
+    @staticmethod
+    def load(path: str):
+        name = path.split("/")[-1]
+        parts = name[:-4].split("-") if name.endswith(".bin") else list()
+        if len(parts) != 3 or "x" not in parts[0]:
+            return None
+        try:
+            size_x, size_y = [int(size) for size in parts[0].split("x")]
+            target_positions = [int(pos) for pos in parts[1].split(".")]
+            free_pos = int(parts[2])
+        except ValueError:
+            return None
+        return PatternDatabase(Board.get(size_x, size_y), target_positions, free_pos, None, path)
+
+    # Maps the file into memory, or reads single entries from it where there is no mmap (MicroPython)
+    def open(self):
+        if self.data != None or self.file != None:
+            return
+        self.file = open(self.path, "rb")
+        try:
+            import mmap
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ImportError:
+            pass
+
+    def entry(self, rank: int) -> int:
+        if self.data == None:
+            self.open()
+            if self.data == None:
+                self.file.seek(rank)
+                return self.file.read(1)[0]
+        return self.data[rank]
+
+    def close(self):
+        if self.file != None:
+            if self.data != None:
+                self.data.close()
+                self.data = None
+            self.file.close()
+            self.file = None
+
+# Returns the disjoint databases in the directory for the board and free field of the target,
+# taking the ones with the most tiles first
+def select_databases(target: PuzzleState, directory: str = PATTERNDB_PATH):
+    try:
+        names = sorted(os.listdir(directory))
+    except OSError:
+        return list()
+
+    free_pos = target.fields.index(FREE_FIELD)
+    databases = list()
+    for name in names:
+        database = PatternDatabase.load(directory + "/" + name)
+        if database != None and database.board == target.board and database.free_pos == free_pos:
+            databases.append(database)
+    databases.sort(key=lambda database: -len(database.target_positions))
+
+    selected = list()
+    covered = set()
+    for database in databases:
+        if len(covered.intersection(database.target_positions)) == 0:
+            selected.append(database)
+            covered.update(database.target_positions)
+    return selected
+
+class PatternDatabaseHeuristic(PuzzleHeuristic):
+    # The databases built in memory, by board, target positions and free field
+    built = dict()
+
+    # groups - the disjoint groups of tiles to build databases for in memory, by default compact_groups
+    # databases - PatternDatabase for disjoint groups of tiles instead, e.g. of select_databases
+    def __init__(self, target: PuzzleState = PuzzleState(), groups = None, databases = None):
+        PuzzleHeuristic.__init__(self, target)
+        self.unit = cost_unit(self.board)
+        if databases == None:
+            groups = groups if groups != None else compact_groups(target)
+            databases = [PatternDatabaseHeuristic.build(target, group) for group in groups]
+        self.databases = databases
+        self.groups = [tuple(target.fields[pos] for pos in database.target_positions) for database in databases]
+        free_pos = target.fields.index(FREE_FIELD)
+        for database in databases:
+            if database.board != self.board or database.free_pos != free_pos:
+                raise ValueError("pattern database " + database.file_name() + " does not match the target")
+            database.open()
+        # The lists group_cost works in, allocated once: the fields ranked per group (its tiles, then the free field),
+        # the position of each field and the positions ranked so far
+        self.placement_fields = [group + (FREE_FIELD,) for group in self.groups]
+        self.positions = [0] * self.board.size
+        self.placement = [0] * (max([len(group) for group in self.groups] + [0]) + 1)
+
+        # Where the target is symmetric to the diagonal of a square board, the state mirrored at the diagonal
+        # (with each tile replaced by the tile whose target is mirrored) needs as many steps with the axes swapped,
+        # so its cost is a lower bound as well. Per position the mirrored position, per field the mirrored field
+        self.mirror_pos = None
+        self.mirror_field = None
+        self.mirrored = [0] * self.board.size
+        board = self.board
+        if board.size_x == board.size_y:
+            mirror_pos = [board.to_pos(board.to_y(pos), board.to_x(pos)) for pos in range(0, board.size)]
+            if mirror_pos[free_pos] == free_pos:
+                self.mirror_pos = mirror_pos
+                self.mirror_field = [0] * board.size
+                for pos in range(0, board.size):
+                    self.mirror_field[target.fields[pos]] = target.fields[mirror_pos[pos]]
+
+    # Returns the database of the tiles for the target, built once
+    @staticmethod
+    def build(target: PuzzleState, tiles):
+        target_positions = tuple(target.fields.index(tile) for tile in tiles)
+        key = (target.board, target_positions, target.fields.index(FREE_FIELD))
+        if key not in PatternDatabaseHeuristic.built:
+            PatternDatabaseHeuristic.built[key] = PatternDatabase.build(target.board, target_positions, key[2])
+        return PatternDatabaseHeuristic.built[key]
+
+    # Uses the databases selected from the directory, and builds databases of up to group_size tiles
+    # for the tiles they leave out
+    @staticmethod
+    def for_target(target: PuzzleState = PuzzleState(), directory: str = PATTERNDB_PATH, group_size: int = 3):
+        databases = select_databases(target, directory)
+        covered = set()
+        for database in databases:
+            covered.update(target.fields[pos] for pos in database.target_positions)
+        remaining = [tile for tile in target.fields if tile != FREE_FIELD and tile not in covered]
+        for group in compact_groups(target, group_size, remaining):
+            databases.append(PatternDatabaseHeuristic.build(target, group))
+        return PatternDatabaseHeuristic(target, databases=databases)
+
+    # The sum of the costs of all groups in cost units, from the packed state value with the free field at free_pos,
+    # or of the mirrored state if that is larger. Works in the lists of __init__, so that a lookup allocates nothing
+    def group_cost(self, value: int, free_pos: int) -> int:
+        board = self.board
+        size = board.size
+        field_bits = board.field_bits
+        field_mask = board.field_mask
+        zero_tile = board.zero_tile
+        positions = self.positions
+        for pos in range(0, size):
+            field = value & field_mask
+            value >>= field_bits
+            if field == FREE_FIELD and pos != free_pos:
+                field = zero_tile
+            positions[field] = pos
+        total = self.placement_cost(positions)
+
+        if self.mirror_pos != None:
+            mirror_pos = self.mirror_pos
+            mirror_field = self.mirror_field
+            mirrored = self.mirrored
+            for field in range(0, size):
+                mirrored[mirror_field[field]] = mirror_pos[positions[field]]
+            mirrored_total = self.placement_cost(mirrored)
+            if mirrored_total > total:
+                total = mirrored_total
+        return total
+
+    # The sum of the costs of all groups in cost units, from the position of each field.
+    # The ranks are computed like placement_rank
+    def placement_cost(self, positions) -> int:
+        size = self.board.size
+        placement = self.placement
+        placement_fields = self.placement_fields
+        databases = self.databases
+        total = 0
+        for group in range(0, len(databases)):
+            fields = placement_fields[group]
+            rank = 0
+            for i in range(0, len(fields)):
+                pos = positions[fields[i]]
+                digit = pos
+                for j in range(0, i):
+                    if placement[j] < pos:
+                        digit -= 1
+                placement[i] = pos
+                rank = rank * (size - i) + digit
+            database = databases[group]
+            data = database.data
+            total += data[rank] if data != None else database.entry(rank)
+        return total
+
+    def estimate(self, value: int, free_pos: int) -> int:
+        steps = (self.group_cost(value, free_pos) + self.unit - 1) // self.unit
+        return max(steps, PuzzleHeuristic.estimate(self, value, free_pos))
@@ -0,0 +1,118 @@
+import json
+from algorithm import PackedPuzzleState, PuzzleState, Step, StepSequence, FREE_FIELD
+from ipc import write_json
+
+# Remembers the solutions of the puzzles played before (e.g. the templates of the UI) in a file on the robot,
+# so that they are not searched again
+#
+# The entries are keyed by the state on its board (see Board.key). A puzzle and the one mirrored at the diagonal of the board
+# (with the tiles relabelled, so the target stays the same) need the same steps with the axes swapped,
+# so both share the entry of the one with the lower key. Once the cache is full, the least recently used entry is dropped
+
+CACHE_PATH = "./solution_cache.json"
+CACHE_CAPACITY = 100
+
+# Returns the fields mirrored at the diagonal, with each tile replaced by the tile whose target is mirrored,
+# or None if the target is not symmetric (the board is not square, or the free field not on the diagonal)
+def transpose_fields(fields, board, target):
+    if board.size_x != board.size_y:
+        return None
+    transposed = [board.to_pos(board.to_y(pos), board.to_x(pos)) for pos in range(0, board.size)]
+    target_pos = dict()
+    for pos in range(0, board.size):
+        target_pos[target[pos]] = pos
+    if transposed[target_pos[FREE_FIELD]] != target_pos[FREE_FIELD]:
+        return None
+
+    result = [FREE_FIELD] * board.size
+    for pos in range(0, board.size):
+        result[transposed[pos]] = target[transposed[target_pos[fields[pos]]]]
+    return result
+
+class SolutionCache:
+    def __init__(self, path: str = CACHE_PATH, capacity: int = CACHE_CAPACITY):
+        self.path = path
+        self.capacity = capacity
+        # per key [steps as strings, last use], read from the file on first use
+        self.entries = None
+        self.clock = 0
+        self.hits = 0
+        self.misses = 0
+
+    def load(self):
+        if self.entries != None:
+            return
+        self.entries = dict()
+        try:
+            with open(self.path, "r") as f:
+                for key, steps, used in json.loads(f.read())["entries"]:
+                    self.entries[key] = [steps, used]
+                    self.clock = max(self.clock, used)
+        except (OSError, ValueError, KeyError):
+            # no cache yet, or a broken one that is replaced with the next solution
+            pass
+
+    def save(self):
+        entries = [[key, entry[0], entry[1]] for key, entry in self.entries.items()]
+        entries.sort(key=lambda entry: entry[2])
+        write_json(self.path, { "entries": entries })
+
+    # Returns (key, whether the puzzle is mirrored to reach the state of the key)
+    @staticmethod
+    def key(puzzle: PuzzleState, target: PuzzleState = None):
+        board = puzzle.board
+        if target == None:
+            target = PuzzleState(board.target, board)
+        prefix = str(board.size_x) + "x" + str(board.size_y) + ":"
+        if target.fields != list(board.target):
+            prefix += "".join(str(field) + "," for field in target.fields) + ":"
+        state = PackedPuzzleState(puzzle.fields, board=board)
+        value = board.key(state.value, state.free_pos)
+        transposed = transpose_fields(puzzle.fields, board, target.fields)
+        if transposed != None:
+            state = PackedPuzzleState(transposed, board=board)
+            transposed_value = board.key(state.value, state.free_pos)
+            if transposed_value < value:
+                return (prefix + str(transposed_value), True)
+        return (prefix + str(value), False)
+
+    # Returns the cached StepSequence that solves the puzzle, or None
+    def get(self, puzzle: PuzzleState, target: PuzzleState = None):
+        self.load()
+        key, transposed = SolutionCache.key(puzzle, target)
+        entry = self.entries.get(key)
+        if entry == None:
+            self.misses += 1
+            return None
+
+        steps = [Step.from_str(step) for step in entry[0]]
+        if transposed:
+            steps = [step.transpose() for step in steps]
+        solution = StepSequence(steps)
+        # checks the solution, the file might have been edited or broken
+        state = puzzle.copy()
+        solution.apply(state)
+        if target == None:
+            target = PuzzleState(puzzle.board.target, puzzle.board)
+        if state.fields != target.fields:
+            del self.entries[key]
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.clock += 1
+        entry[1] = self.clock
+        self.save()
+        return solution
+
+    # Adds the solution of the puzzle, which should be the best one the solver finds
+    def put(self, puzzle: PuzzleState, solution: StepSequence, target: PuzzleState = None):
+        self.load()
+        key, transposed = SolutionCache.key(puzzle, target)
+        steps = [step.transpose() if transposed else step for step in solution.steps]
+        self.clock += 1
+        self.entries[key] = [[step.to_str() for step in steps], self.clock]
+        while len(self.entries) > self.capacity:
+            oldest = min(self.entries.keys(), key=lambda key: self.entries[key][1])
+            del self.entries[oldest]
+        self.save()
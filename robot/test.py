@@ -1,5 +1,29 @@
-from unittest import TestCase, main
-from algorithm import StepDirection, Step, PuzzleState, StepSequence, PuzzleSolver, SIZE_X
+from unittest import TestCase, main, skipIf
+import gzip
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from algorithm import StepDirection, Step, PuzzleState, StepSequence, PuzzleSolver, PackedPuzzleState, PuzzleHeuristic, SolutionTable, TranspositionTable, Board, SearchCore, FREE_FIELD, SIZE_X, TARGET_FIELDS, permutation_rank, validate_puzzle
+from build_table import build_table
+from build_patterndb import build_patterndb
+from batch import read_patterns, solve_many
+from benchmark import build_corpus, benchmark, compare
+import http.client
+import http_runner
+from http_runner import StatusWatcher
+import ipc
+from motion import MotionCost, OVERSHOOT_X, OVERSHOOT_Y, TILT_Y, is_level
+from solution_cache import SolutionCache, transpose_fields
+from patterndb import PatternDatabase, PatternDatabaseHeuristic, compact_groups, ordered_groups, placement_count, placement_positions, placement_rank, select_databases
+# pattern.py runs on a computer with NumPy
+try:
+    import numpy as np
+    import pattern
+except ImportError:
+    pattern = None
 
 class TestStepDirection(TestCase):
     def test_inverse(self):
@@ -124,11 +148,191 @@ class PuzzleStateTest(TestCase):
              7, 4, 5,
              8, 0, 6)))
 
+    def test_validate(self):
+        self.assertEqual(validate_puzzle(TARGET_FIELDS), None)
+        self.assertEqual(validate_puzzle((1, 2, 3, 4, 5, 6, 7, 0, 8)), None)
+        self.assertEqual(validate_puzzle((1, 2, 3, 4, 5, 6, 7, 8))["reason"], "size")
+        self.assertEqual(validate_puzzle((1, 2, 3, 4, 5, 6, 7, 8, 9))["reason"], "free-field")
+        self.assertEqual(validate_puzzle((1, 2, 3, 4, 0, 6, 7, 0, 8))["reason"], "free-field")
+        self.assertEqual(validate_puzzle((1, 2, 3, 4, 4, 6, 7, 0, 8))["reason"], "tiles")
+        self.assertEqual(validate_puzzle((1, 2, 3, 4, 5, 6, 8, 7, 0))["reason"], "parity")
+        self.assertEqual(validate_puzzle((1, 2, 3, 4, 5, 6, 8, 7, 0), (1, 2, 3, 4, 5, 6, 0, 8, 7)), None)
+
+class PackedPuzzleStateTest(TestCase):
+    def test_apply(self):
+        for i in range(0, 1000):
+            state = PuzzleState()
+            packed = PackedPuzzleState()
+            for j in range(0, 10):
+                # includes steps that move more tiles than possible
+                step = Step(StepDirection.random(), random.randint(1, 2))
+                state.apply(step)
+                packed.apply(step)
+                self.assertListEqual(packed.fields, state.fields, step.to_str())
+                self.assertEqual(packed.free_pos, state.free_pos)
+
+    def test_eq(self):
+        packed = PackedPuzzleState()
+        self.assertEqual(packed, PackedPuzzleState(PuzzleState().fields))
+        self.assertEqual(packed, PuzzleState())
+        packed.apply(Step(StepDirection.DOWN, 1))
+        self.assertNotEqual(packed, PackedPuzzleState())
+
+    def test_sequence(self):
+        sequence = StepSequence(list())
+        sequence.fillRandom(5, PackedPuzzleState())
+        puzzle = PackedPuzzleState()
+        sequence.apply(puzzle)
+        sequence.invert().apply(puzzle)
+        self.assertEqual(puzzle, PackedPuzzleState())
+
+    def test_small_value(self):
+        # tile 8 is packed as 0 like the free field, the position of the free field tells them apart
+        a = PackedPuzzleState((1, 2, 3, 4, 5, 6, 7, 8, 0))
+        b = PackedPuzzleState((1, 2, 3, 4, 5, 6, 7, 0, 8))
+        self.assertEqual(a.value, b.value)
+        self.assertNotEqual(a, b)
+        self.assertNotEqual(hash(a), hash(b))
+        self.assertListEqual(b.fields, [1, 2, 3, 4, 5, 6, 7, 0, 8])
+        self.assertEqual(PuzzleHeuristic().estimate(b.value, b.free_pos), 1)
+
+        keys = set()
+        for i in range(0, 1000):
+            fields = list(TARGET_FIELDS)
+            random.shuffle(fields)
+            packed = PackedPuzzleState(fields)
+            # small ints on MicroPython have 31 bits
+            self.assertLess(packed.value, 1 << 30)
+            self.assertLess(TranspositionTable.key(packed, Step(StepDirection.UP, 1)), 1 << 30)
+            self.assertListEqual(packed.fields, fields)
+            keys.add((hash(packed), tuple(fields)))
+        self.assertEqual(len(set(key for key, fields in keys)), len(keys))
+
+    def test_boards(self):
+        for board in (Board.get(4, 4), Board.get(4, 3), Board.get(2, 5)):
+            for i in range(0, 100):
+                state = PuzzleState(board.target, board)
+                packed = PackedPuzzleState(board.target, board=board)
+                for j in range(0, 10):
+                    step = Step(StepDirection.random(), random.randint(1, board.max_step))
+                    state.apply(step)
+                    packed.apply(step)
+                    self.assertListEqual(packed.fields, state.fields, step.to_str())
+                    self.assertEqual(packed.free_pos, state.free_pos)
+                self.assertIsNone(validate_puzzle(state.fields, board.target, board))
+
+class BoardTest(TestCase):
+    def test_lookups(self):
+        board = Board.get(4, 4)
+        self.assertIs(board, Board.for_fields(board.target))
+        self.assertIs(Board.for_fields(TARGET_FIELDS), Board.get(3, 3))
+        self.assertEqual(board.target[-2:], (15, 0))
+        self.assertEqual(StepDirection.UP.stride(board), -4)
+        self.assertEqual(StepDirection.RIGHT.max_moves(0, board), 0)
+        self.assertEqual(StepDirection.LEFT.max_moves(0, board), 3)
+        self.assertEqual(StepDirection.DOWN.offset_in_dir(5, board), 2)
+        self.assertTrue(StepDirection.DOWN.is_at_border(2, board))
+        self.assertEqual(len(board.possible_steps(15)), 6)
+        self.assertEqual([step.to_str() for step in board.possible_steps(5, Step(StepDirection.UP, 1))], [">1", "<1", "<2"])
+        with self.assertRaises(Exception):
+            Board.for_fields(range(0, 12))
+
+    def test_moves(self):
+        for board in (Board.get(3, 3), Board.get(4, 3)):
+            for pos in range(0, board.size):
+                for axis in range(0, 3):
+                    moves = board.child_moves[pos * 3 + axis]
+                    self.assertListEqual([board.move_steps[move] for move in moves], board.steps[pos * 3 + axis])
+                    for move in moves:
+                        fields = [FREE_FIELD] + [field for field in range(1, board.size)]
+                        fields[0], fields[pos] = fields[pos], FREE_FIELD
+                        state = PackedPuzzleState(fields, board=board)
+                        value = board.apply_move(state.value, move)
+                        state.apply(board.move_steps[move])
+                        self.assertEqual(value, state.value)
+                        self.assertEqual(board.move_free[move], state.free_pos)
+                        for child in board.move_children[move]:
+                            self.assertNotEqual(board.move_x[child], board.move_x[move])
+
+    def test_15_puzzle(self):
+        board = Board.get(4, 4)
+        state = PuzzleState(board.target)
+        state.apply(Step(StepDirection.DOWN, 3))
+        state.apply(Step(StepDirection.RIGHT, 3))
+        self.assertEqual(state.fields[:5], [0, 1, 2, 3, 5])
+        self.assertIn("F", state.to_str())
+        self.assertEqual(StepSequence.step_between(15, 3, board).to_str(), "v3")
+        # swapping two tiles on an even width board
+        self.assertEqual(validate_puzzle(list(board.target[:13]) + [15, 14, 0], board.target)["reason"], "parity")
+        self.assertIsNone(validate_puzzle([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 0, 15], board.target))
+
+        heuristic = PatternDatabaseHeuristic(PuzzleState(board.target))
+        self.assertEqual(heuristic.groups, compact_groups(PuzzleState(board.target)))
+        for i in range(0, 5):
+            sequence = StepSequence(list())
+            sequence.fillRandom(10, PuzzleState(board.target))
+            puzzle = PuzzleState(board.target)
+            sequence.apply(puzzle)
+
+            solver = PuzzleSolver(puzzle)
+            solver.solve_ida(10, heuristic)
+            reference = PuzzleSolver(puzzle)
+            reference.solve_ida(10)
+            self.assertEqual(len(solver.solution.steps), len(reference.solution.steps), sequence.to_str())
+            self.assertLessEqual(solver.stats.node_count, reference.stats.node_count)
+            packed = PackedPuzzleState(puzzle.fields)
+            self.assertLessEqual(heuristic.estimate(packed.value, packed.free_pos), len(solver.solution.steps))
+
+            solver.solution.apply(puzzle)
+            self.assertListEqual(puzzle.fields, list(board.target))
+
+    def test_deep_puzzles(self):
+        # the most steps on the 5x2 board, beyond the 24 of the 3x3 board
+        board = Board.get(5, 2)
+        solver = PuzzleSolver(PuzzleState([5, 4, 3, 2, 1, 0, 9, 8, 7, 6], board))
+        solver.solve_bidirectional()
+        self.assertEqual(len(solver.solution.steps), 36)
+        self.assertEqual(Board.get(4, 4).max_depth, 80)
+
+        # shuffled by 30 random steps
+        board = Board.get(4, 4)
+        puzzle = PuzzleState([0, 8, 10, 4, 3, 1, 2, 11, 6, 7, 14, 12, 13, 9, 5, 15], board)
+        solver = PuzzleSolver(puzzle)
+        solver.solve_ida(heuristic=PatternDatabaseHeuristic(PuzzleState(board.target)))
+        self.assertEqual(len(solver.solution.steps), 19)
+        solver.solution.apply(puzzle)
+        self.assertListEqual(puzzle.fields, list(board.target))
+
+        self.assertListEqual(ordered_groups(PuzzleState(board.target)), [(1, 2, 3, 4), (5, 6, 7, 8), (9, 10, 11, 12), (13, 14, 15)])
+        # the mirrored lookup needs a target symmetric to the diagonal
+        target = PuzzleState(list(board.target[:-2]) + [0, 15], board)
+        self.assertIsNone(PatternDatabaseHeuristic(target, [(1, 2)]).mirror_pos)
+
 class StepSequenceTest(TestCase):
     def eq(self, a: PuzzleState, b: PuzzleState, msg: str):
         self.assertListEqual(a.fields, b.fields, msg)
         self.assertEqual(a.free_pos, b.free_pos, msg)
 
+    def test_merged(self):
+        sequence = StepSequence([Step.from_str(step) for step in ("<1", "<1", "^2", "v1", ">2", "<2", "^1", "<2")])
+        self.assertEqual(sequence.merged().to_str(), "")
+        sequence = StepSequence([Step.from_str(step) for step in ("<1", "v1", ">1", ">1", "<1", "^2", "v1")])
+        self.assertEqual(sequence.merged().to_str(), " v1 >1")
+
+    def test_optimize(self):
+        # rotating the tiles in the lower right corner three times
+        sequence = StepSequence([Step.from_str(step) for step in ("v1", ">1", "^1", "<1") * 3 + ("v2",)])
+        self.assertEqual(sequence.optimize().to_str(), " v2")
+
+        for i in range(0, 100):
+            sequence = StepSequence([Step(StepDirection.random(), random.randint(1, 2)) for j in range(0, 12)])
+            optimized = sequence.optimize()
+            self.assertLessEqual(len(optimized.steps), len(sequence.steps))
+            puzzle = PuzzleState()
+            sequence.apply(puzzle)
+            optimized.invert().apply(puzzle)
+            self.eq(puzzle, PuzzleState(), sequence.to_str())
+
     def test_random(self):
         for i in range(0, 1000):
             sequence = StepSequence(list())
@@ -139,11 +343,641 @@ class StepSequenceTest(TestCase):
             sequence.invert().apply(puzzle)
             self.eq(puzzle, PuzzleState(), sequence.to_str())
 
+class BatchTest(TestCase):
+    def test_solve_many(self):
+        patterns = [
+            (7, 0, 2, 5, 1, 3, 8, 4, 6),
+            (1, 2, 3, 4, 5, 6, 7, 0, 8),
+            (7, 0, 2, 5, 1, 3, 8, 4, 6),
+            (1, 2, 3, 4, 5, 6, 7, 8, 0)
+        ]
+        cache = dict()
+        results = list(solve_many(patterns, 2, cache))
+        self.assertListEqual([list(fields) for fields in patterns], [fields for fields, solution, error in results])
+        self.assertEqual(len(results[0][1].split()), 10)
+        self.assertEqual(results[0][1], results[2][1])
+        self.assertEqual(results[1][1], " <1")
+        self.assertEqual(results[3][1], "")
+        self.assertEqual(len(cache), 3)
+
+    def test_bad_lines(self):
+        lines = ["12345678", "1,2,3,4,5,6,7,8,9,10,11,12,13,14,0,15", "12a", "123456708"]
+        results = list(solve_many(read_patterns(lines), 2))
+        self.assertEqual(len(results), 4)
+        self.assertIsNone(results[0][1])
+        self.assertIn("8 fields", results[0][2])
+        self.assertEqual(results[1][1], " <1")
+        self.assertIsNone(results[1][2])
+        self.assertEqual(results[2][0], "12a")
+        self.assertIsNotNone(results[2][2])
+        self.assertEqual(results[3][1], " <1")
+
+class BenchmarkTest(TestCase):
+    def test_corpus(self):
+        corpus = build_corpus(7, (5, 10), 3)
+        self.assertListEqual(corpus, build_corpus(7, (5, 10), 3))
+        self.assertEqual(len(corpus), 2 * 3 + 3 + 3)
+        corpus = build_corpus(7, (5,), 3, Board.get(4, 4))
+        self.assertEqual(len(corpus), 3)
+        self.assertEqual(len(corpus[0][1]), 16)
+
+    def test_compare(self):
+        corpus = build_corpus(7, (5,), 2)
+        results = benchmark(corpus, ["bidirectional"], False)
+        self.assertListEqual(compare(results, results, 0.2), [])
+
+        baseline = [dict(result) for result in results]
+        baseline[0]["length"] += 1
+        self.assertEqual(len(compare(results, baseline, 0.2)), 1)
+
+class StatusWatcherTest(TestCase):
+    def test_wait(self):
+        watcher = StatusWatcher(os.path.join(tempfile.mkdtemp(), "status.json"))
+        self.assertFalse(watcher.poll())
+        with open(watcher.path, "w") as f:
+            f.write('{ "status": "waiting" }')
+        self.assertTrue(watcher.poll())
+        self.assertFalse(watcher.poll())
+        self.assertEqual(watcher.wait(), (1, { "status": "waiting" }))
+        self.assertEqual(watcher.wait(1, 0.01)[0], 1)
+
+        # a half written file keeps the previous version
+        with open(watcher.path, "w") as f:
+            f.write('{ "status": ')
+        self.assertFalse(watcher.poll())
+
+        threading.Timer(0.05, lambda: watcher.poll()).start()
+        with open(watcher.path, "w") as f:
+            f.write('{ "status": "solve", "search_depth": 5 }')
+        version, status = watcher.wait(1, 5)
+        self.assertEqual(version, 2)
+        self.assertEqual(json.loads(watcher.to_json(version, status))["version"], 2)
+
+    def test_events(self):
+        watcher = StatusWatcher(os.path.join(tempfile.mkdtemp(), "status.json"))
+        watcher.log = http_runner.EventLog(4)
+        for i in range(6):
+            watcher.update({ "status": "move", "move": i })
+
+        result = watcher.events(4)
+        self.assertEqual(result["cursor"], 6)
+        self.assertFalse(result["missed"])
+        self.assertListEqual([event["status"]["move"] for event in result["events"]], [4, 5])
+        # the first two events were dropped
+        result = watcher.events(0)
+        self.assertTrue(result["missed"])
+        self.assertListEqual([event["id"] for event in result["events"]], [3, 4, 5, 6])
+        self.assertFalse(watcher.events(2)["missed"])
+        self.assertListEqual(watcher.events(6, 0.01)["events"], [])
+
+class WebServerTest(TestCase):
+    def test_index(self):
+        http_runner.index_page = http_runner.StaticPage(b"<html>" + b"puzzle " * 1000 + b"</html>")
+        server = http_runner.ThreadingServer(("127.0.0.1", 0), http_runner.WebServer)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            # the requests reuse the connection
+            connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+            connection.request("GET", "/", headers={ "Accept-Encoding": "gzip, deflate" })
+            response = connection.getresponse()
+            body = response.read()
+            self.assertEqual(response.status, 200)
+            self.assertEqual(response.getheader("Content-Encoding"), "gzip")
+            self.assertEqual(int(response.getheader("Content-Length")), len(body))
+            self.assertEqual(gzip.decompress(body), http_runner.index_page.body)
+            etag = response.getheader("ETag")
+
+            connection.request("GET", "/", headers={ "Accept-Encoding": "gzip", "If-None-Match": etag })
+            response = connection.getresponse()
+            self.assertEqual(response.status, 304)
+            self.assertEqual(response.read(), b"")
+
+            # without gzip the other etag does not match
+            connection.request("GET", "/", headers={ "If-None-Match": etag })
+            response = connection.getresponse()
+            self.assertEqual(response.status, 200)
+            self.assertEqual(response.getheader("Content-Encoding"), None)
+            self.assertEqual(response.read(), http_runner.index_page.body)
+            connection.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+class JsonFileTest(TestCase):
+    def test_read_write(self):
+        path = os.path.join(tempfile.mkdtemp(), "command.json")
+        reader = ipc.JsonFile(path)
+        writer = ipc.JsonFile(path)
+        with self.assertRaises(OSError):
+            reader.read()
+
+        writer.write({ "command": "solve", "version": 1 })
+        self.assertFalse(os.path.exists(path + ".tmp"))
+        self.assertEqual(reader.read()["version"], 1)
+        # an unchanged file is not read again
+        reader.value["command"] = "cached"
+        self.assertEqual(reader.read()["command"], "cached")
+
+        writer.write({ "command": "wait", "version": 2 })
+        self.assertEqual(reader.read(), { "command": "wait", "version": 2 })
+        self.assertEqual(writer.text, reader.text)
+
+    def test_unchanged_file(self):
+        path = os.path.join(tempfile.mkdtemp(), "command.json")
+        reader = ipc.JsonFile(path)
+        writer = ipc.JsonFile(path)
+        writer.write({ "command": "wait", "version": 1 })
+        # a file modified within the resolution of the time is read on every read
+        self.assertEqual(reader.read()["version"], 1)
+        self.assertEqual(reader.read()["version"], 1)
+        self.assertEqual(reader.reads, 2)
+
+        # an older file is not opened again while its key stays the same
+        modified = time.time() - 10
+        os.utime(path, (modified, modified))
+        reader.read()
+        self.assertEqual(reader.reads, 3)
+        for i in range(5):
+            self.assertEqual(reader.read()["version"], 1)
+        self.assertEqual(reader.reads, 3)
+
+        # missed writes of the same size are detected, even when the inode of the file read before comes back
+        for version in range(2, 6):
+            writer.write({ "command": "wait", "version": version })
+        self.assertEqual(reader.read()["version"], 5)
+        self.assertEqual(reader.reads, 4)
+
+    def test_quick_writes(self):
+        path = os.path.join(tempfile.mkdtemp(), "command.json")
+        reader = ipc.JsonFile(path)
+        writer = ipc.JsonFile(path)
+        watcher = StatusWatcher(path)
+        # writes of the same size within the same second, of which the reader misses every other one
+        for version in range(10, 30):
+            writer.write({ "command": "wait", "version": version })
+            if version % 2 == 1:
+                self.assertEqual(reader.read()["version"], version)
+                self.assertTrue(watcher.poll())
+                self.assertEqual(watcher.status["version"], version)
+
+class ChannelTest(TestCase):
+    def test_messages(self):
+        path = os.path.join(tempfile.mkdtemp(), ipc.SOCKET_NAME)
+        server = ipc.listen(path)
+        client = ipc.connect(path)
+        channel = ipc.Channel(server.accept()[0])
+
+        self.assertListEqual(channel.receive(), [])
+        client.send("status", { "status": "waiting" })
+        client.send("status", { "status": "solve", "search_depth": 3 })
+        messages = channel.receive(1000)
+        while len(messages) < 2:
+            messages += channel.receive(1000)
+        self.assertListEqual([message["seq"] for message in messages], [1, 2])
+        self.assertEqual(messages[1]["body"]["search_depth"], 3)
+
+        channel.send("command", { "command": "exit" })
+        self.assertEqual(client.receive(1000)[0]["body"], { "command": "exit" })
+
+        client.close()
+        with self.assertRaises(OSError):
+            channel.receive(1000)
+        channel.close()
+        server.close()
+
+    def test_permissions(self):
+        directory = tempfile.mkdtemp()
+        os.chmod(directory, 0o755)
+        path = os.path.join(directory, ipc.SOCKET_NAME)
+        umask = os.umask(0o077)
+        try:
+            server = ipc.listen(path)
+        finally:
+            os.umask(umask)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o666)
+
+        if os.getuid() == 0:
+            # connects as another user, like the motor controller does
+            pid = os.fork()
+            if pid == 0:
+                os.setuid(65534)
+                channel = ipc.connect(path)
+                os._exit(0 if channel != None else 1)
+            self.assertEqual(os.waitpid(pid, 0)[1], 0)
+        else:
+            client = ipc.connect(path)
+            self.assertIsNotNone(client)
+            client.close()
+        server.close()
+
+    def test_no_server(self):
+        self.assertEqual(ipc.connect(os.path.join(tempfile.mkdtemp(), ipc.SOCKET_NAME)), None)
+
+class SolutionCacheTest(TestCase):
+    def test_transpose(self):
+        self.assertListEqual(transpose_fields(list(TARGET_FIELDS), Board.get(3, 3), TARGET_FIELDS), list(TARGET_FIELDS))
+        board = Board.get(4, 4)
+        self.assertListEqual(transpose_fields(list(board.target), board, board.target), list(board.target))
+        self.assertIsNone(transpose_fields(list(range(1, 12)) + [0], Board.get(4, 3), Board.get(4, 3).target))
+
+        puzzle = PuzzleState((7, 0, 2, 5, 1, 3, 8, 4, 6))
+        transposed = PuzzleState(transpose_fields(puzzle.fields, puzzle.board, TARGET_FIELDS))
+        self.assertEqual(SolutionCache.key(puzzle)[0], SolutionCache.key(transposed)[0])
+        self.assertNotEqual(SolutionCache.key(puzzle)[1], SolutionCache.key(transposed)[1])
+
+    def test_get(self):
+        path = os.path.join(tempfile.mkdtemp(), "solution_cache.json")
+        cache = SolutionCache(path, 2)
+        puzzles = [PuzzleState(fields) for fields in ((7, 0, 2, 5, 1, 3, 8, 4, 6), (1, 5, 7, 8, 3, 0, 2, 4, 6), (1, 2, 3, 4, 5, 6, 0, 7, 8))]
+        for puzzle in puzzles:
+            self.assertIsNone(cache.get(puzzle))
+            solver = PuzzleSolver(puzzle)
+            solver.solve_ida()
+            cache.put(puzzle, solver.solution)
+
+        # the least recently used puzzle was dropped, the others are in the file
+        cache = SolutionCache(path, 2)
+        self.assertIsNone(cache.get(puzzles[0]))
+        for puzzle in puzzles[1:] + [PuzzleState(transpose_fields(puzzle.fields, puzzle.board, TARGET_FIELDS)) for puzzle in puzzles[1:]]:
+            solution = cache.get(puzzle)
+            reference = PuzzleSolver(puzzle)
+            reference.solve_ida()
+            self.assertEqual(len(solution.steps), len(reference.solution.steps))
+            state = puzzle.copy()
+            solution.apply(state)
+            self.assertListEqual(state.fields, list(TARGET_FIELDS))
+        self.assertEqual(cache.hits, 4)
+
+        # a broken entry is dropped
+        with open(path, "r") as f:
+            entries = json.load(f)["entries"]
+        entries[0][1] = ["^1"]
+        ipc.write_json(path, { "entries": entries })
+        cache = SolutionCache(path, 2)
+        self.assertEqual(sum(1 for puzzle in puzzles[1:] if cache.get(puzzle) == None), 1)
+
+class MotionTest(TestCase):
+    def test_pipelined(self):
+        random.seed(7)
+        for i in range(0, 20):
+            sequence = StepSequence(list())
+            sequence.fillRandom(10)
+            puzzle = PuzzleState()
+            pipelined = MotionCost().sequence(sequence, puzzle)
+            sequential = MotionCost(False).sequence(sequence, puzzle)
+            self.assertLessEqual(pipelined, sequential)
+            self.assertGreaterEqual(pipelined, MotionCost().min_step() * len(sequence.steps))
+
+    def test_is_level(self):
+        self.assertTrue(is_level(0, 0))
+        self.assertTrue(is_level(-OVERSHOOT_X, OVERSHOOT_Y))
+        self.assertFalse(is_level(0, TILT_Y))
+        self.assertFalse(is_level(OVERSHOOT_X + 1, 0))
+
 class SolverTest(TestCase):
+    def test_solve_parallel(self):
+        for fields, length in (((7, 0, 2, 5, 1, 3, 8, 4, 6), 10), ((1, 5, 7, 8, 3, 0, 2, 4, 6), 17), ((1, 2, 3, 4, 5, 6, 7, 0, 8), 1)):
+            puzzle = PuzzleState(fields)
+            solver = PuzzleSolver(puzzle)
+            solver.solve_parallel(processes=2)
+            self.assertEqual(len(solver.solution.steps), length)
+            solver.solution.apply(puzzle)
+            self.assertListEqual(puzzle.fields, list(TARGET_FIELDS))
+
+    def test_search_core(self):
+        puzzle = PackedPuzzleState((1, 5, 7, 8, 3, 0, 2, 4, 6))
+        target = PackedPuzzleState()
+        core = SearchCore()
+        heuristic = PuzzleHeuristic()
+        self.assertEqual(core.search(puzzle.value, puzzle.free_pos, target.value, target.free_pos, 10, heuristic), 11)
+        self.assertIsNone(core.solution)
+        core.search(puzzle.value, puzzle.free_pos, target.value, target.free_pos, 17, heuristic)
+        self.assertEqual(len(core.solution), 17)
+
+        # deeper than the levels allocated at first, without recursion
+        core.search(puzzle.value, puzzle.free_pos, target.value, target.free_pos, 40, first=False, ordered=True, heuristic=heuristic,
+                    poll=lambda bound: None if core.solution != None else bound)
+        self.assertTrue(core.stopped)
+        self.assertGreater(core.levels, 40)
+        state = PuzzleState(puzzle.fields)
+        StepSequence(core.solution).apply(state)
+        self.assertListEqual(state.fields, list(TARGET_FIELDS))
+
+        # the search continues after a prefix
+        core.search(puzzle.value, puzzle.free_pos, target.value, target.free_pos, 17, heuristic, first=False)
+        prefix = core.solution[:3]
+        state = PackedPuzzleState(puzzle.fields)
+        for step in prefix[:-1]:
+            state.apply(step)
+        prev_move = PackedPuzzleState().board.move_index(state.free_pos, prefix[-1])
+        state.apply(prefix[-1])
+        core.search(state.value, state.free_pos, target.value, target.free_pos, 17, heuristic, prev_move=prev_move, depth=3)
+        self.assertEqual(len(core.solution), 14)
+
+    def test_transpositions(self):
+        fields = (7, 0, 2, 5, 1, 3, 8, 4, 6)
+        reference = PuzzleSolver(PuzzleState(fields))
+        reference.solve(10)
+
+        for eviction in ("deepest", "clear", "keep"):
+            transpositions = TranspositionTable(500, eviction)
+            solver = PuzzleSolver(PuzzleState(fields))
+            solver.solve(10, transpositions)
+            self.assertEqual(len(solver.solution.steps), len(reference.solution.steps), eviction)
+            self.assertLessEqual(transpositions.stats()["entries"], 500)
+            self.assertGreater(transpositions.stats()["pruned"], 0)
+
+            solver.solve_ida(transpositions=transpositions)
+            self.assertEqual(len(solver.solution.steps), len(reference.solution.steps), eviction)
+
+    def test_stats(self):
+        solver = PuzzleSolver(PuzzleState((1, 5, 7, 8, 3, 0, 2, 4, 6)))
+        reports = list()
+        solver.progress = lambda stats: reports.append(stats.bound)
+        solver.progress_interval = 1000
+        solver.solve_ida()
+
+        stats = solver.stats
+        self.assertEqual(stats.bound, 17)
+        self.assertEqual(stats.rounds[-1]["bound"], 17)
+        self.assertEqual(sum(round["nodes"] for round in stats.rounds), stats.node_count)
+        self.assertEqual(sum(stats.nodes_per_depth), stats.node_count)
+        self.assertEqual(stats.solutions_found, 1)
+        self.assertGreater(stats.branching_factor(), 1)
+        self.assertLess(stats.branching_factor(), 6)
+        self.assertGreaterEqual(len(reports), len(stats.rounds) + stats.node_count // 1000)
+        self.assertEqual(stats.to_dict()["nodes"], stats.node_count)
+
+        solver = PuzzleSolver(PuzzleState((7, 0, 2, 5, 1, 3, 8, 4, 6)))
+        solver.solve(10)
+        self.assertGreater(solver.stats.solutions_improved, 0)
+        self.assertGreaterEqual(solver.stats.solutions_found, solver.stats.solutions_improved)
+
+    def test_solve_anytime(self):
+        for fields, length in (((7, 0, 2, 5, 1, 3, 8, 4, 6), 10), ((1, 5, 7, 8, 3, 0, 2, 4, 6), 17), ((1, 2, 3, 4, 5, 6, 7, 8, 0), 0)):
+            solutions = list()
+            solver = PuzzleSolver(PuzzleState(fields))
+            self.assertTrue(solver.solve_anytime(solutions.append))
+            self.assertEqual(len(solver.solution.steps), length)
+            self.assertIs(solutions[-1], solver.solution)
+            lengths = [len(solution.steps) for solution in solutions]
+            self.assertListEqual(lengths, sorted(lengths, reverse=True))
+            self.assertEqual(len(set(lengths)), len(lengths))
+
+            puzzle = PuzzleState(fields)
+            solver.solution.apply(puzzle)
+            self.assertListEqual(puzzle.fields, list(TARGET_FIELDS))
+
+    def test_solve_anytime_budget(self):
+        solver = PuzzleSolver(PuzzleState((1, 4, 7, 2, 0, 8, 3, 6, 5)))
+        self.assertFalse(solver.solve_anytime(time_budget=500, transpositions=TranspositionTable()))
+        self.assertNotEqual(solver.solution, None)
+        self.assertLess(solver.stats.duration(), 2000)
+
+    def test_solve_fastest(self):
+        for fields, length in (((7, 0, 2, 5, 1, 3, 8, 4, 6), 10), ((1, 5, 7, 8, 3, 0, 2, 4, 6), 17), ((1, 2, 3, 4, 5, 6, 7, 8, 0), 0)):
+            solver = PuzzleSolver(PuzzleState(fields))
+            solver.solve_fastest()
+            self.assertEqual(len(solver.solution.steps), length)
+            self.assertEqual(solver.solution_cost, length)
+
+        cost = MotionCost()
+        random.seed(5)
+        for i in range(0, 10):
+            sequence = StepSequence(list())
+            sequence.fillRandom(12)
+            puzzle = PuzzleState()
+            sequence.apply(puzzle)
+
+            solver = PuzzleSolver(puzzle)
+            solver.solve_fastest(cost)
+            self.assertEqual(cost.sequence(solver.solution, puzzle), solver.solution_cost)
+            reference = PuzzleSolver(puzzle)
+            reference.solve_ida()
+            self.assertLessEqual(solver.solution_cost, cost.sequence(reference.solution, puzzle))
+
+            solver.solution.apply(puzzle)
+            self.assertListEqual(puzzle.fields, list(TARGET_FIELDS))
+
+    def test_solve_bidirectional_target(self):
+        puzzle = PuzzleState((1, 2, 3, 0, 4, 5, 6, 7, 8))
+        target = PuzzleState((0, 8, 7, 6, 5, 4, 3, 2, 1))
+        solver = PuzzleSolver(puzzle, target)
+        solver.solve_bidirectional()
+        solver.solution.apply(puzzle)
+        self.assertListEqual(puzzle.fields, target.fields)
+
     def test_solve(self):
         puzzle = PuzzleState([1, 2, 3, 4, 0, 6, 7, 8, 5])
         solver = PuzzleSolver(puzzle)
         solver.solve_adaptive()
         self.assertEqual(solver.solution, None)
 
+class SolutionTableTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.path = os.path.join(tempfile.mkdtemp(), "solution_table.bin")
+        build_table(cls.path)
+        cls.table = SolutionTable(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.table.close()
+        os.remove(cls.path)
+
+    def test_rank(self):
+        self.assertEqual(permutation_rank((0, 1, 2, 3, 4, 5, 6, 7, 8)), 0)
+        self.assertEqual(permutation_rank((0, 1, 2, 3, 4, 5, 6, 8, 7)), 1)
+        self.assertEqual(permutation_rank((8, 7, 6, 5, 4, 3, 2, 1, 0)), 362879)
+
+    def test_solve(self):
+        for i in range(0, 100):
+            sequence = StepSequence(list())
+            sequence.fillRandom(8)
+            puzzle = PuzzleState()
+            sequence.apply(puzzle)
+
+            solver = PuzzleSolver(puzzle)
+            solver.solve_from_table(self.table)
+            reference = PuzzleSolver(puzzle)
+            reference.solve(8)
+            self.assertEqual(len(solver.solution.steps), len(reference.solution.steps), sequence.to_str())
+
+            solver.solution.apply(puzzle)
+            self.assertListEqual(puzzle.fields, list(TARGET_FIELDS))
+
+    def test_heuristic(self):
+        heuristic = PuzzleHeuristic()
+        for i in range(0, 1000):
+            fields = list(TARGET_FIELDS)
+            random.shuffle(fields)
+            entry = self.table.entry(fields)
+            if entry == 0xFF:
+                continue
+            packed = PackedPuzzleState(fields)
+            self.assertLessEqual(heuristic.estimate(packed.value, packed.free_pos), entry & 0x1F, str(fields))
+
+    def test_pattern_database(self):
+        heuristic = PatternDatabaseHeuristic()
+        for i in range(0, 1000):
+            fields = list(TARGET_FIELDS)
+            random.shuffle(fields)
+            entry = self.table.entry(fields)
+            if entry == 0xFF:
+                continue
+            packed = PackedPuzzleState(fields)
+            estimate = heuristic.estimate(packed.value, packed.free_pos)
+            self.assertLessEqual(estimate, entry & 0x1F, str(fields))
+            self.assertGreaterEqual(estimate, PuzzleHeuristic().estimate(packed.value, packed.free_pos))
+
+    def test_pattern_database_files(self):
+        self.assertEqual(placement_rank((0, 1, 2), 9), 0)
+        self.assertEqual(placement_rank((8, 7, 6), 9), placement_count(3, 9) - 1)
+        self.assertListEqual(placement_positions(placement_rank((5, 0, 8, 2), 9), 4, 9), [5, 0, 8, 2])
+
+        directory = tempfile.mkdtemp()
+        build_patterndb(Board.get(3, 3), [(1, 2, 4, 5), (3, 6, 7), (1, 8)], directory)
+        build_patterndb(Board.get(4, 4), [(1, 2)], directory)
+        databases = select_databases(PuzzleState(), directory)
+        self.assertListEqual([database.target_positions for database in databases], [(0, 1, 3, 4), (2, 5, 6)])
+        self.assertIsNone(databases[0].data)
+
+        heuristic = PatternDatabaseHeuristic.for_target(PuzzleState(), directory)
+        self.assertListEqual(heuristic.groups, [(1, 2, 4, 5), (3, 6, 7), (8,)])
+        built = PatternDatabase.build(Board.get(3, 3), (0, 1, 3, 4), 8)
+        for rank in range(0, len(built.data), 97):
+            self.assertEqual(databases[0].entry(rank), built.data[rank])
+        for i in range(0, 1000):
+            fields = list(TARGET_FIELDS)
+            random.shuffle(fields)
+            entry = self.table.entry(fields)
+            if entry == 0xFF:
+                continue
+            packed = PackedPuzzleState(fields)
+            self.assertLessEqual(heuristic.estimate(packed.value, packed.free_pos), entry & 0x1F, str(fields))
+        for database in databases + heuristic.databases:
+            database.close()
+
+    def test_validate(self):
+        for i in range(0, 1000):
+            fields = list(TARGET_FIELDS)
+            random.shuffle(fields)
+            self.assertEqual(validate_puzzle(fields) == None, self.table.entry(fields) != 0xFF, str(fields))
+
+    def test_solve_ida(self):
+        for fields in ((7, 0, 2, 5, 1, 3, 8, 4, 6), (1, 5, 7, 8, 3, 0, 2, 4, 6), (0, 8, 7, 6, 5, 4, 3, 2, 1)):
+            solver = PuzzleSolver(PuzzleState(fields))
+            solver.solve_ida()
+            reference = PuzzleSolver(PuzzleState(fields))
+            reference.solve_from_table(self.table)
+            self.assertEqual(len(solver.solution.steps), len(reference.solution.steps))
+
+            puzzle = PuzzleState(fields)
+            solver.solution.apply(puzzle)
+            self.assertListEqual(puzzle.fields, list(TARGET_FIELDS))
+
+    def test_solve_bidirectional(self):
+        for i in range(0, 20):
+            fields = list(TARGET_FIELDS)
+            random.shuffle(fields)
+            solver = PuzzleSolver(PuzzleState(fields))
+            solver.solve_bidirectional()
+            reference = PuzzleSolver(PuzzleState(fields))
+            reference.solve_from_table(self.table)
+            if reference.solution == None:
+                self.assertEqual(solver.solution, None)
+                continue
+            self.assertEqual(len(solver.solution.steps), len(reference.solution.steps), str(fields))
+
+            puzzle = PuzzleState(fields)
+            solver.solution.apply(puzzle)
+            self.assertListEqual(puzzle.fields, list(TARGET_FIELDS))
+
+    def test_unsolvable(self):
+        solver = PuzzleSolver(PuzzleState([1, 2, 3, 4, 0, 6, 7, 8, 5]))
+        solver.solve_from_table(self.table)
+        self.assertEqual(solver.solution, None)
+
+@skipIf(pattern == None, "needs NumPy")
+class PatternTest(TestCase):
+    # Draws the yellow parts of the tiles in the pattern on a gray background
+    def render(self, fields, cell: int = 12, margin: int = 20):
+        size = pattern.RASTER * cell + 2 * margin
+        image = np.full((size, size + 7, 3), 90, dtype=np.uint8)
+        for pos, field in enumerate(fields):
+            if field == 0:
+                continue
+            part = pattern.MAPPINGS[field - 1].reshape(pattern.PER_TILE, pattern.PER_TILE)
+            for y, x in zip(*np.nonzero(part)):
+                top = margin + ((pos // 3) * pattern.PER_TILE + y) * cell
+                left = margin + ((pos % 3) * pattern.PER_TILE + x) * cell
+                image[top + 1:top + cell - 1, left + 1:left + cell - 1] = (220, 200, 40)
+        return image
+
+    def test_analyze(self):
+        for fields in [TARGET_FIELDS, (8, 6, 5, 7, 3, 1, 2, 0, 4), (1, 4, 7, 2, 0, 8, 3, 6, 5)]:
+            result = pattern.analyze_raster(self.render(fields))
+            self.assertListEqual(result.pattern, list(fields))
+            self.assertTrue(result.is_valid())
+            self.assertGreater(result.confidence, 0.9)
+            self.assertIsNone(validate_puzzle(result.pattern))
+
+        # yellow outside of the tiles moves the box
+        image = self.render(TARGET_FIELDS)
+        image[0:3, 0:3] = (220, 200, 40)
+        self.assertFalse(pattern.analyze_raster(image).pattern == list(TARGET_FIELDS))
+
+        empty = pattern.analyze_frames([np.zeros((10, 10, 4), dtype=np.uint8)])[0]
+        self.assertEqual(empty.confidence, 0)
+        self.assertFalse(empty.is_valid())
+        self.assertEqual(pattern.expected_pattern("scans/123456780-dark.png"), [1, 2, 3, 4, 5, 6, 7, 8, 0])
+
+    def test_scan(self):
+        image = self.render(TARGET_FIELDS)
+        # a stray yellow pixel in a corner moves the box and misreads the tiles
+        outlier = image.copy()
+        outlier[0, 0] = (220, 200, 40)
+
+        scanner = pattern.FrameScanner(window=5, agreement=4)
+        frames = [image, outlier, image, image, image, image, image]
+        result = scanner.scan(iter(frames))
+        self.assertListEqual(result.pattern, list(TARGET_FIELDS))
+        # the frames after the outlier are analyzed, as the box moved back - then every other one is skipped
+        self.assertEqual(scanner.frames, 7)
+        self.assertEqual(scanner.analyzed, 5)
+        self.assertEqual(result.confidence, 0.8)
+
+        # once stable, frames with the same box are skipped
+        self.assertIs(scanner.process(image), result)
+        self.assertEqual(scanner.analyzed, 5)
+
+        # an invalid pattern never becomes stable
+        scanner.reset()
+        self.assertIsNone(scanner.scan([self.render((1, 1, 3, 4, 5, 6, 7, 8, 0))] * 10))
+        self.assertEqual(scanner.analyzed, 10)
+
+    def test_scan_still_frames(self):
+        image = self.render(TARGET_FIELDS)
+        scanner = pattern.FrameScanner(window=5, agreement=4)
+        result = scanner.scan([image] * 10)
+        self.assertListEqual(result.pattern, list(TARGET_FIELDS))
+        self.assertEqual(scanner.frames, 7)
+        self.assertEqual(scanner.analyzed, 4)
+        self.assertLess(scanner.analyzed, scanner.frames)
+        self.assertEqual(len(scanner.votes), 4)
+
+    def test_scan_noisy_first_frame(self):
+        # the first frame is misread with the same box as the following ones, which outvote it
+        noisy = self.render((2, 1, 3, 4, 5, 6, 7, 8, 0))
+        image = self.render(TARGET_FIELDS)
+        self.assertEqual(pattern.yellow_box(pattern.yellow_mask(noisy)), pattern.yellow_box(pattern.yellow_mask(image)))
+
+        scanner = pattern.FrameScanner(window=5, agreement=4)
+        result = scanner.scan([noisy] + [image] * 8)
+        self.assertListEqual(result.pattern, list(TARGET_FIELDS))
+        # the skipped frames do not vote, so the noisy frame needs four analyzed frames against it
+        self.assertEqual(scanner.frames, 9)
+        self.assertEqual(scanner.analyzed, 5)
+        self.assertEqual(result.confidence, 0.8)
+
 main()
\ No newline at end of file
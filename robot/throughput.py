@@ -0,0 +1,104 @@
+import gc
+from algorithm import PuzzleHeuristic, PuzzleSolver, PuzzleState, StepSequence, TranspositionTable, time_ms
+from ui import TEMPLATES
+
+# Measures the states per second the depth first searches visit, on a computer and on the EV3
+# (run it like main_ev3.py, the output shows in the VS Code terminal):
+#
+#   python throughput.py
+#
+# MicroPython counts the bytes it allocates, so there the garbage collector is paused for one search
+# to report the bytes allocated per visited state.
+# ida-recursive is the recursive IDA* search the solvers used before SearchCore, as the baseline to compare with
+
+# The IDA* search of PuzzleSolver.solve_ida, recursing per step and applying and inverting Steps on a PackedPuzzleState
+def solve_ida_recursive(solver: PuzzleSolver, max_depth: int = 24):
+    heuristic = PuzzleHeuristic(solver.target)
+    solver.solution = None
+    stats = solver.start_stats()
+    path = list()
+    state, target = solver.packed()
+
+    # returns None if a solution was found, otherwise the smallest estimate exceeding the bound
+    def search(depth: int, bound: int):
+        stats.visit(depth)
+        if state == target:
+            stats.found(True)
+            return None
+
+        estimate = depth + heuristic.estimate(state.value, state.free_pos)
+        if estimate > bound:
+            return estimate
+
+        stats.expanded += 1
+        minimum = max_depth + 1
+        for step in state.possibleSteps(path[-1] if len(path) > 0 else None):
+            state.apply(step)
+            path.append(step)
+            result = search(depth + 1, bound)
+            if result == None:
+                return None
+            if result < minimum:
+                minimum = result
+            state.apply(step.inverse())
+            path.pop()
+        return minimum
+
+    bound = heuristic.estimate(state.value, state.free_pos)
+    while bound <= max_depth:
+        stats.start_round(bound)
+        bound = search(0, bound)
+        stats.end_round()
+        if bound == None:
+            solver.solution = StepSequence(path)
+            return
+
+STRATEGIES = (
+    ("ida-recursive", solve_ida_recursive),
+    ("ida", lambda solver: solver.solve_ida()),
+    ("ida-tt", lambda solver: solver.solve_ida(transpositions=TranspositionTable(10000))),
+    ("anytime", lambda solver: solver.solve_anytime()),
+    ("dfs", lambda solver: solver.solve(8))
+)
+
+def measure(strategy, fields):
+    solver = PuzzleSolver(PuzzleState(fields))
+    gc.collect()
+    start = time_ms()
+    strategy(solver)
+    duration = max(time_ms() - start, 1)
+    return (solver.stats.node_count, duration)
+
+# The bytes allocated per visited state, or None where the runtime does not count them (CPython)
+def allocation(strategy, fields):
+    try:
+        mem_alloc = gc.mem_alloc
+    except AttributeError:
+        return None
+    solver = PuzzleSolver(PuzzleState(fields))
+    gc.collect()
+    gc.disable()
+    try:
+        before = mem_alloc()
+        strategy(solver)
+        allocated = mem_alloc() - before
+    finally:
+        gc.enable()
+    return allocated / max(solver.stats.node_count, 1)
+
+def main():
+    for name, strategy in STRATEGIES:
+        total_nodes = 0
+        total_duration = 0
+        for template, fields in TEMPLATES.items():
+            nodes, duration = measure(strategy, fields)
+            total_nodes += nodes
+            total_duration += duration
+        line = name + ": " + str(total_nodes) + " states in " + str(total_duration) + "ms, " + str(total_nodes * 1000 // total_duration) + " states/s"
+        bytes_per_node = allocation(strategy, TEMPLATES["easy"])
+        if bytes_per_node != None:
+            line += ", " + str(round(bytes_per_node, 1)) + " bytes/state"
+        print(line)
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,21 @@
-from algorithm import PuzzleSolver, PuzzleState, StepSequence, StepSequenceCursor, FREE_FIELD
+from algorithm import PuzzleSolver, PuzzleState, SolutionTable, StepSequence, StepSequenceCursor, TranspositionTable, FREE_FIELD, validate_puzzle
+from motion import MotionCost
+from solution_cache import SolutionCache
+
+# The number of states the solver remembers to skip them when they are reached again
+TRANSPOSITION_CAPACITY = 50000
+
+# The puzzles to choose from in the template game mode
+TEMPLATES = {
+    "easy": (7, FREE_FIELD, 2, 5, 1, 3, 8, 4, 6),
+    "medium": (1, 5, 7, 8, 3, FREE_FIELD, 2, 4, 6),
+    "hard": (FREE_FIELD, 8, 7, 6, 5, 4, 3, 2, 1)
+}
 
 class PuzzleUI:
     def __init__(self, ctrl):
         self.ctrl = ctrl
+        self.cache = SolutionCache()
 
     def init(self):
         while True:
@@ -49,6 +62,8 @@ class PuzzleUI:
         # Only do at most 9 moves - so that the depth search finds something
         # without taking too long
         shuffle_sequence.fillRandom(9)
+        # reaches the same shuffled state with less moves of the robot
+        shuffle_sequence = shuffle_sequence.optimize()
         self.puzzle = PuzzleState()
         self.cursor = StepSequenceCursor(shuffle_sequence)
         self.play()
@@ -57,47 +72,106 @@ class PuzzleUI:
     def init_template(self):
         self.ctrl.cls()
         template = self.ctrl.select("Difficulty", ["easy", "medium", "hard"])
-        if template == "easy":
-            self.puzzle = PuzzleState((7, FREE_FIELD, 2, 5, 1, 3, 8, 4, 6))
-        elif template == "medium":
-            self.puzzle = PuzzleState((1, 5, 7, 8, 3, FREE_FIELD, 2, 4, 6))
-        else:
-            self.puzzle = PuzzleState((FREE_FIELD, 8, 7, 6, 5, 4, 3, 2, 1))
+        self.puzzle = PuzzleState(TEMPLATES[template])
 
     def solve(self):
         self.ctrl.cls()
         self.ctrl.print("Solving Puzzle")
-        solver = PuzzleSolver(self.puzzle)
-        
+
+        # Reject bad scans before searching for minutes
+        problem = validate_puzzle(self.puzzle.fields)
+        if problem != None:
+            self.failed(problem)
+
         self.ctrl.solve_progress(0, 0)
         total_start_time = self.ctrl.time_ms()
+        cost = MotionCost()
+
+        # Puzzles played before are not searched again, the cache only has the solutions with the least steps
+        solution = self.cache.get(self.puzzle) if not self.ctrl.solve_fastest else None
+        if solution != None:
+            self.ctrl.print("+ cache")
+        else:
+            solution = self.search(total_start_time, cost)
 
-        # "the 8 Puzzle always can be solved in no more than 31 single-tile moves or 24 multi-tile moves"
-        # ~ https://en.wikipedia.org/wiki/15_puzzle
-        for max_depth in (5, 10, 15, 24):
-            self.ctrl.solve_progress(max_depth, self.ctrl.time_ms() - total_start_time)
-            self.ctrl.print("+ depth " + str(max_depth))
-            start_time = self.ctrl.time_ms()
-            solver.solve(max_depth)
-            duration = self.ctrl.time_ms() - start_time
-            self.ctrl.print("        " + str(duration) + "ms")
-
-            if solver.solution != None:
-                break
-
-        if solver.solution == None:
-            self.ctrl.cls()
-            self.ctrl.print("Unsolvable Puzzle")
-            self.ctrl.wait_for_enter()
-            self.ctrl.solve_failed()
-
-            raise Exception("Failed to solve puzzle")
+        if solution == None:
+            self.failed(None)
         
-        self.cursor = StepSequenceCursor(solver.solution, self.puzzle)
+        self.cursor = StepSequenceCursor(solution, self.puzzle)
+
+        # The milliseconds the robot is predicted to need for the solution
+        predicted_duration = cost.sequence(solution, self.puzzle)
 
         self.ctrl.cls()
-        self.ctrl.solve_succeeded(len(solver.solution.steps), self.ctrl.time_ms() - total_start_time)
+        self.ctrl.solve_succeeded(len(solution.steps), self.ctrl.time_ms() - total_start_time, predicted_duration)
         self.ctrl.print("Solved Puzzle")
+        self.ctrl.print("~ " + str(predicted_duration // 1000) + "s to move")
+
+    # Searches the solution of the puzzle with the strategy the controller asks for
+    def search(self, total_start_time: int, cost: MotionCost):
+        solver = PuzzleSolver(self.puzzle)
+        # whether the solution has the least steps, to be cached
+        optimal = True
+
+        # Use the precomputed table if it was downloaded to the robot
+        table = SolutionTable.load()
+        if self.ctrl.solve_fastest:
+            # Minimize the time the robot needs instead of the number of steps
+            self.ctrl.print("+ fastest")
+            solver.progress = lambda stats: self.ctrl.solve_progress(stats.bound, self.ctrl.time_ms() - total_start_time, stats.to_dict())
+            solver.solve_fastest(cost)
+            optimal = False
+        elif table != None:
+            self.ctrl.print("+ table")
+            solver.solve_from_table(table)
+        elif self.ctrl.solve_processes > 1:
+            self.ctrl.print("+ " + str(self.ctrl.solve_processes) + " processes")
+            solver.solve_parallel(processes=self.ctrl.solve_processes)
+        elif self.ctrl.solve_time_budget != None:
+            # Start moving with the best solution found within the budget,
+            # every strictly shorter solution found before replaces it
+            def found(solution):
+                self.ctrl.print("+ " + str(len(solution.steps)) + " steps")
+                self.ctrl.solve_progress(len(solution.steps), self.ctrl.time_ms() - total_start_time, solver.stats.to_dict())
+
+            solver.progress = lambda stats: self.ctrl.solve_progress(stats.bound, self.ctrl.time_ms() - total_start_time, stats.to_dict())
+            if not solver.solve_anytime(found, self.ctrl.solve_time_budget, transpositions=TranspositionTable(TRANSPOSITION_CAPACITY)):
+                self.ctrl.print("+ out of time")
+                optimal = False
+        else:
+            transpositions = TranspositionTable(TRANSPOSITION_CAPACITY)
+            last_bound = None
+
+            # called at the start of each iteration and every few thousand states within
+            def progress(stats):
+                nonlocal last_bound
+                status = stats.to_dict()
+                status.update(transpositions.stats())
+                self.ctrl.solve_progress(stats.bound, self.ctrl.time_ms() - total_start_time, status)
+                if stats.bound != last_bound:
+                    last_bound = stats.bound
+                    self.ctrl.print("+ depth " + str(stats.bound))
+
+            solver.progress = progress
+            # "the 8 Puzzle always can be solved in no more than 31 single-tile moves or 24 multi-tile moves"
+            # ~ https://en.wikipedia.org/wiki/15_puzzle
+            solver.solve_ida(transpositions=transpositions)
+            self.ctrl.print("        " + str(self.ctrl.time_ms() - total_start_time) + "ms")
+
+        if solver.solution != None and optimal:
+            self.cache.put(self.puzzle, solver.solution)
+        return solver.solution
+
+    # problem - the reason returned by validate_puzzle, or None if the search found no solution
+    def failed(self, problem):
+        self.ctrl.cls()
+        self.ctrl.print("Unsolvable Puzzle")
+        if problem != None:
+            self.ctrl.print(problem["reason"])
+        self.ctrl.wait_for_enter()
+        self.ctrl.solve_failed(problem)
+
+        raise Exception("Failed to solve puzzle")
 
     def play(self):
         try: